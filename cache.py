@@ -0,0 +1,186 @@
+import gzip
+import hashlib
+import io
+import os
+import pickle
+import zlib
+
+from utils import VERSION
+
+CACHE_DIR = "__mochacache__"
+# Suffixes of cached programs, as opposed to the parse tables that share the cache directory
+PROGRAM_SUFFIXES = ("mochac", "mochapy")
+
+# Statements pickled together in a cached program; pickles share class references within a batch
+BATCH_SIZE = 64
+
+
+def cache_key(*parts):
+    """Short digest that identifies a cache entry."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else repr(part).encode())
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def variant_key(key, options):
+    """Key for the variant of an entry made with `options`; variants of one entry are kept side by side."""
+    return f"{key}-{cache_key(options)}"
+
+
+def cache_path(directory, name, key, suffix):
+    """Path of the cache entry `name` with the given key, inside `directory`'s cache directory."""
+    return os.path.join(directory, CACHE_DIR, f"{name}.{key}.{suffix}")
+
+
+def read(path):
+    """Contents of a cache entry, or None if it does not exist."""
+    try:
+        with open(path, "rb") as file:
+            return file.read()
+    except OSError:
+        return None
+
+
+def write(path, data):
+    """Write a cache entry and remove the entries for the same name with other keys."""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write under a temporary name so concurrent runs never see a partial entry
+        temporary = temporary_path(path)
+        with open(temporary, "wb") as file:
+            file.write(data)
+        install(temporary, path)
+    except OSError:
+        pass
+
+
+def temporary_path(path):
+    return f"{path}.{os.getpid()}.tmp"
+
+
+def install(temporary, path):
+    """Move a fully written entry into place and remove the entries for the same name with other keys.
+
+    Variants of the entry, such as other optimization levels of the same source, are kept.
+    """
+    directory, filename = os.path.split(path)
+    name, key, suffix = filename.rsplit(".", 2)
+    entry = key.split("-")[0]
+    for other in os.listdir(directory):
+        parts = other.rsplit(".", 2)
+        if other != filename and parts[0] == name and parts[2:] == [suffix] and parts[1].split("-")[0] != entry:
+            os.remove(os.path.join(directory, other))
+    os.replace(temporary, path)
+
+
+def clear(script):
+    """Remove every cached program in the cache directory next to `script`, but not the parse tables."""
+    directory = os.path.join(os.path.dirname(os.path.abspath(script)), CACHE_DIR)
+    try:
+        for name in os.listdir(directory):
+            if name.rsplit(".", 1)[-1] in PROGRAM_SUFFIXES:
+                os.remove(os.path.join(directory, name))
+    except OSError:
+        pass
+
+
+def program_path(script, source, options=""):
+    """Path of the cached syntax tree (.mochac) for `script` with the given source text and options."""
+    key = variant_key(cache_key(source, VERSION), options)
+    return cache_path(os.path.dirname(os.path.abspath(script)), os.path.basename(script), key, "mochac")
+
+
+def load_program(script, source, options=""):
+    """The cached top-level statements of `script`, or None if there are none or the entry is corrupt.
+
+    The whole entry is read before any statement runs, so a corrupt entry is just a cache miss.
+    """
+    try:
+        with gzip.open(program_path(script, source, options), "rb") as file:
+            return read_statements(file)
+    except (OSError, EOFError, zlib.error, pickle.UnpicklingError, AttributeError, ImportError, TypeError, ValueError):
+        return None
+
+
+def read_statements(file):
+    statements = []
+    while (batch := pickle.load(file)) is not None:
+        count, data = batch
+        unpickler = pickle.Unpickler(io.BytesIO(data))
+        statements.extend(unpickler.load() for _ in range(count))
+    return statements
+
+
+def store_program(script, source, statements, options=""):
+    """Write the top-level statements of `script` to the cache."""
+    writer = ProgramWriter(program_path(script, source, options))
+    for statement in statements:
+        writer.add(statement)
+    writer.close()
+
+
+class ProgramWriter:
+    """Writes a program to the cache one top-level statement at a time.
+
+    The entry is a gzip stream of pickled batches of statements ending with None,
+    so it can be written while the program is parsed. Array literals whose elements
+    are all constants are stored as the Arrays the parser made of them; any other
+    literal is an ArrayNode, which is stored as a node and evaluated when it runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.temporary = temporary_path(path)
+        self.new_batch()
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Node pickles repeat the same class and attribute names, so they compress very well
+            self.file = gzip.open(self.temporary, "wb", compresslevel=1)
+        except OSError:
+            self.file = None
+
+    def new_batch(self):
+        # Statements of a batch share one pickler, so class references are written once per batch
+        self.buffer = io.BytesIO()
+        self.pickler = pickle.Pickler(self.buffer, pickle.HIGHEST_PROTOCOL)
+        self.count = 0
+
+    def add(self, statement):
+        """Serialize a statement; this happens right away, since running a statement changes its nodes."""
+        if self.file is None:
+            return
+        try:
+            self.pickler.dump(statement)
+        except (RecursionError, pickle.PicklingError):
+            self.close(commit=False)
+            return
+        self.count += 1
+        if self.count == BATCH_SIZE:
+            self.flush()
+
+    def flush(self):
+        try:
+            pickle.dump((self.count, self.buffer.getvalue()), self.file, pickle.HIGHEST_PROTOCOL)
+        except OSError:
+            self.close(commit=False)
+        self.new_batch()
+
+    def close(self, commit=True):
+        """Finish the entry, or throw it away if the program was not parsed completely."""
+        if commit and self.file is not None and self.count:
+            self.flush()
+        if self.file is None:
+            return
+        file, self.file = self.file, None
+        try:
+            if commit:
+                pickle.dump(None, file)
+            file.close()
+            if commit:
+                install(self.temporary, self.path)
+            else:
+                os.remove(self.temporary)
+        except OSError:
+            pass
@@ -0,0 +1,264 @@
+from obj_model import *
+
+# Opcodes
+LOAD_CONST = 0
+LOAD_NAME = 1
+STORE_NAME = 2
+POP_TOP = 3
+BINARY_OP = 4
+UNARY_OP = 5
+LOAD_ATTR = 6
+JUMP = 7
+POP_JUMP_IF_FALSE = 8
+BUILD_RANGE = 9
+GET_ITER = 10
+FOR_ITER = 11
+UPDATE_LOOP_RESULT = 12
+MAKE_FUNCTION = 13
+CALL_FUNCTION = 14
+RETURN_VALUE = 15
+SAY = 16
+ASK = 17
+EXIT = 18
+EVAL_NODE = 19
+TO_BOOL = 20
+JUMP_IF_FALSE_OR_POP = 21
+JUMP_IF_TRUE_OR_POP = 22
+LOAD_FAST = 23
+STORE_FAST = 24
+LOAD_CELL = 25
+STORE_CELL = 26
+LOAD_FREE = 27
+TAIL_CALL = 28
+
+OPNAMES = {value: name for name, value in list(globals().items()) if name.isupper() and isinstance(value, int)}
+
+BINARY_METHODS = tuple(BINOP_TO_FUNC_MAP.values())
+BINARY_OPS = {op: index for index, op in enumerate(BINOP_TO_FUNC_MAP)}
+# (operation, result type) on the values of two Numbers, for each BINARY_OP argument
+NUMBER_OPERATIONS = tuple(NUMBER_BINOPS.get(op) for op in BINOP_TO_FUNC_MAP)
+UNARY_METHODS = tuple(UNOP_TO_FUNC_MAP.values())
+UNARY_OPS = {op: index for index, op in enumerate(UNOP_TO_FUNC_MAP)}
+
+
+class CodeObject:
+    """A compiled unit of MochaScript bytecode."""
+
+    def __init__(self, name=None, parameters=(), scope=None):
+        self.instructions = []
+        self.consts = []
+        self.names = []
+        self.name = name
+        self.parameters = list(parameters)
+        self.scope = scope
+
+    def emit(self, op, arg=0):
+        """Append an instruction and return its position."""
+        self.instructions += (op, arg)
+        return len(self.instructions) - 2
+
+    def patch(self, position, target):
+        """Point the jump at `position` to `target`."""
+        self.instructions[position + 1] = target
+
+    def here(self):
+        """Position of the next instruction."""
+        return len(self.instructions)
+
+    def add_const(self, value):
+        """Return the index of a constant, adding it if necessary."""
+        for index, const in enumerate(self.consts):
+            if const is value:
+                return index
+        self.consts.append(value)
+        return len(self.consts) - 1
+
+    def add_name(self, name):
+        """Return the index of a name, adding it if necessary."""
+        if name not in self.names:
+            self.names.append(name)
+        return self.names.index(name)
+
+    def disassemble(self):
+        """Human-readable listing of the instructions."""
+        lines = []
+        for position in range(0, len(self.instructions), 2):
+            op, arg = self.instructions[position : position + 2]
+            if op in (LOAD_NAME, STORE_NAME):
+                detail = self.names[arg]
+            elif op == LOAD_ATTR:
+                detail = self.consts[arg].left
+            elif op in (LOAD_CONST, MAKE_FUNCTION, EVAL_NODE):
+                const = self.consts[arg]
+                detail = const.name if isinstance(const, CodeObject) else type(const).__name__
+            elif op in (LOAD_FAST, STORE_FAST, LOAD_CELL, STORE_CELL):
+                detail = self.scope.names[arg]
+            elif op == LOAD_FREE:
+                detail = self.scope.free[arg][1]
+            elif op == BINARY_OP:
+                detail = BINARY_METHODS[arg]
+            elif op == UNARY_OP:
+                detail = UNARY_METHODS[arg]
+            else:
+                detail = ""
+            lines.append(f"{position:>6} {OPNAMES[op]:<20} {arg:<4} {detail}".rstrip())
+        return "\n".join(lines)
+
+    def __repr__(self):
+        return f"<code {self.name or '<program>'}>"
+
+
+class Compiler:
+    """Lowers a MochaScript syntax tree into bytecode for the VM."""
+
+    def __init__(self):
+        self._dispatch = {}
+
+    def compile(self, node, name=None, parameters=(), scope=None):
+        """Compile a syntax tree into a CodeObject."""
+        code = CodeObject(name, parameters, scope)
+        self.visit(node, code)
+        code.emit(RETURN_VALUE)
+        return code
+
+    def visit(self, node, code):
+        """Emit the instructions for `node` into `code`."""
+        node_type = type(node)
+        method = self._dispatch.get(node_type)
+        if method is None:
+            for cls in node_type.__mro__:
+                method = getattr(self, f"compile_{cls.__name__}", None)
+                if method is not None:
+                    break
+            self._dispatch[node_type] = method
+        method(node, code)
+
+    def compile_Atom(self, node, code):
+        code.emit(LOAD_CONST, code.add_const(node))
+
+    def compile_Function(self, node, code):
+        if node.scope is None:
+            resolve(node)
+        body = self.compile(node.body, node.name, node.parameters, node.scope)
+        code.emit(MAKE_FUNCTION, code.add_const(body))
+
+    def compile_SpecialExpression(self, node, code):
+        # Nodes without a dedicated lowering are evaluated by the tree-walker
+        code.emit(EVAL_NODE, code.add_const(node))
+
+    def compile_BlockNode(self, node, code):
+        exprs = node.flatten()
+        if not exprs:
+            code.emit(LOAD_CONST, code.add_const(None))
+        for index, expr in enumerate(exprs):
+            if index:
+                code.emit(POP_TOP)
+            self.visit(expr, code)
+
+    def compile_BinOp(self, node, code):
+        self.visit(node.right, code)
+        if node.op == ".":
+            # The node holds the attribute's inline cache
+            code.emit(LOAD_ATTR, code.add_const(node.as_getattr()))
+            return
+        self.visit(node.left, code)
+        code.emit(BINARY_OP, BINARY_OPS[node.op])
+
+    def compile_LogicalNode(self, node, code):
+        self.visit(node.right, code)
+        code.emit(TO_BOOL)
+        to_end = code.emit(JUMP_IF_FALSE_OR_POP if node.op == "&&" else JUMP_IF_TRUE_OR_POP)
+        self.visit(node.left, code)
+        code.emit(TO_BOOL)
+        code.patch(to_end, code.here())
+
+    def compile_UnOp(self, node, code):
+        self.visit(node.value, code)
+        code.emit(UNARY_OP, UNARY_OPS[node.op])
+
+    def compile_IfNode(self, node, code):
+        self.visit(node.condition, code)
+        to_false = code.emit(POP_JUMP_IF_FALSE)
+        self.visit(node.true_block, code)
+        to_end = code.emit(JUMP)
+        code.patch(to_false, code.here())
+        self.visit(node.false_block, code)
+        code.patch(to_end, code.here())
+
+    def compile_WhileNode(self, node, code):
+        # The loop result stays on the stack and is replaced by each iteration
+        code.emit(LOAD_CONST, code.add_const(None))
+        top = code.here()
+        self.visit(node.condition, code)
+        to_end = code.emit(POP_JUMP_IF_FALSE)
+        code.emit(POP_TOP)
+        self.visit(node.block, code)
+        code.emit(JUMP, top)
+        code.patch(to_end, code.here())
+
+    def compile_ForNode(self, node, code):
+        code.emit(LOAD_CONST, code.add_const(None))
+        self.visit(node.iterator, code)
+        code.emit(GET_ITER)
+        top = code.emit(FOR_ITER)
+        self.store(node, node.var, code)
+        code.emit(POP_TOP)
+        self.visit(node.body, code)
+        code.emit(UPDATE_LOOP_RESULT)
+        code.emit(JUMP, top)
+        code.patch(top, code.here())
+
+    def compile_LoopInvariantNode(self, node, code):
+        self.visit(node.expr, code)
+
+    def compile_HoistedLoopNode(self, node, code):
+        self.visit(node.loop, code)
+
+    def compile_RangeNode(self, node, code):
+        self.visit(node.start, code)
+        self.visit(node.end, code)
+        code.emit(BUILD_RANGE)
+
+    def compile_SayNode(self, node, code):
+        self.visit(node.expr, code)
+        code.emit(SAY)
+
+    def compile_AskNode(self, node, code):
+        self.visit(node.expr, code)
+        code.emit(ASK)
+
+    def compile_ExitNode(self, node, code):
+        self.visit(node.expr, code)
+        code.emit(EXIT)
+
+    def compile_CallFunctionNode(self, node, code):
+        self.visit(node.function, code)
+        for argument in node.arguments:
+            self.visit(argument, code)
+        code.emit(TAIL_CALL if node.tail else CALL_FUNCTION, len(node.arguments))
+
+    def compile_AssignmentNode(self, node, code):
+        self.visit(node.value, code)
+        self.store(node, node.name, code)
+
+    def compile_InPlaceAssignmentNode(self, node, code):
+        self.visit(node.operation.right, code)
+        self.visit(node.value, code)
+        code.emit(BINARY_OP, BINARY_OPS[node.op])
+        self.store(node, node.name, code)
+
+    def compile_ReferenceNode(self, node, code):
+        if not node.places:
+            code.emit(LOAD_NAME, code.add_name(node.name))
+        elif len(node.places) == 1:
+            kind, index = node.places[0]
+            code.emit({LOCAL: LOAD_FAST, CELL: LOAD_CELL, FREE: LOAD_FREE}[kind], index)
+        else:
+            # Variables that shadow those of enclosing functions are rare, so leave them to the tree-walker
+            code.emit(EVAL_NODE, code.add_const(node))
+
+    def store(self, node, name, code):
+        if node.slot is None:
+            code.emit(STORE_NAME, code.add_name(name))
+        else:
+            code.emit(STORE_CELL if node.cell else STORE_FAST, node.slot)
@@ -1,5 +1,10 @@
+import re
+
 import sly
 
+# Backslash escapes in string literals, and what they stand for
+ESCAPES = {"n": "\n", "t": "\t", "\\": "\\"}
+
 
 class Lexer(sly.Lexer):
     """MochaScript lexer class."""
@@ -54,6 +59,7 @@ class Lexer(sly.Lexer):
         TO,
         IN,
         FN,
+        STRUCT,
     }
 
     ignore_comment = r"#.*"
@@ -61,9 +67,14 @@ class Lexer(sly.Lexer):
 
     # Literals and identifiers
     NUMBER = r"([0-9]+\.?[0-9]*|\.[0-9]+)"
-    STRING = r"\"[^\"]*\""
     IDENT = r"[a-zA-Z_][a-zA-Z0-9_]*"
 
+    @_(r"\"[^\"]*\"")
+    def STRING(self, t):
+        """String literal; the token value is the text between the quotes, with escapes replaced."""
+        t.value = re.sub(r"\\(.)", lambda match: ESCAPES.get(match[1], match[0]), t.value[1:-1], flags=re.DOTALL)
+        return t
+
     # Parentheses types
     LPAREN = r"\("
     RPAREN = r"\)"
@@ -125,3 +136,4 @@ class Lexer(sly.Lexer):
     IDENT["to"] = TO
     IDENT["in"] = IN
     IDENT["fn"] = FN
+    IDENT["struct"] = STRUCT
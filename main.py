@@ -1,36 +1,218 @@
+import time
+
+# Phase timestamps for --startup-report. Importing lex and parse builds the lexer and parser classes.
+STARTUP = {"start": time.perf_counter()}
+
+import argparse
 import sys
+import tracemalloc
+
+import cache
+from compiler import Compiler
+from obj_model import Boolean, Number, String, object_size
+from optimize import Optimizer, format_tree
+from output import BUFFER_SIZE, OUTPUT, POLICIES
+from transpile import Transpiler, load_cached, store_cached
+from utils import PROMPT
+from vm import VM
 
+STARTUP["import"] = time.perf_counter()
 from lex import Lexer
+
+STARTUP["lexer build"] = time.perf_counter()
 from parse import Parser
-from utils import PROMPT
 
+STARTUP["parser build"] = time.perf_counter()
+
+ENGINES = ("tree", "vm", "py")
+
+
+def evaluate(ast, engine="tree"):
+    """Evaluate a syntax tree with the selected execution engine."""
+    if engine == "vm":
+        return VM().run(Compiler().compile(ast))
+    if engine == "py":
+        return Transpiler().transpile(ast).run()
+    return ast.visit()
+
+
+def parse_source(source, lexer: Lexer, parser: Parser, optimizer: Optimizer):
+    """Parse and optimize MochaScript source code."""
+    ast = parser.parse(lexer.tokenize(source))
+    return optimizer.optimize(ast) if ast else ast
+
+
+def stream_source(source, lexer: Lexer, parser: Parser, optimizer: Optimizer, run, writer=None):
+    """Parse, optimize and run MochaScript source code one top-level statement at a time.
+
+    Returns whether the whole source parsed without errors.
+    """
+
+    def on_statement(statement):
+        statement = optimizer.optimize(statement)
+        if writer:
+            # Stored before running, since evaluation specializes the nodes in place
+            writer.add(statement)
+        run(statement)
 
-def shell(lexer: Lexer, parser: Parser):
+    parser.on_statement = on_statement
+    try:
+        parser.parse(lexer.tokenize(source))
+    finally:
+        parser.on_statement = None
+    return not parser.errors
+
+
+def report_startup():
+    """Print how long each startup phase took."""
+    phases = list(STARTUP.items())
+    for (_, previous), (phase, current) in zip(phases, phases[1:]):
+        print(f"{phase:>12}: {(current - previous) * 1000:8.2f} ms", file=sys.stderr)
+
+
+def report_memory():
+    """Print the size of common values and how much memory the program allocated."""
+    for value in (Number(0.5), Boolean(True), String("text")):
+        print(f"{type(value).__name__:>12}: {object_size(value):8} bytes", file=sys.stderr)
+    snapshot = tracemalloc.take_snapshot()
+    current, peak = tracemalloc.get_traced_memory()
+    print(f"{'peak':>12}: {peak / 1024:8.1f} KB", file=sys.stderr)
+    print(f"{'retained':>12}: {current / 1024:8.1f} KB", file=sys.stderr)
+    print(f"{'live blocks':>12}: {sum(stat.count for stat in snapshot.statistics('filename')):8}", file=sys.stderr)
+    for stat in snapshot.statistics("lineno")[:5]:
+        frame = stat.traceback[0]
+        print(f"{stat.count:>12} blocks, {stat.size / 1024:8.1f} KB at {frame.filename}:{frame.lineno}", file=sys.stderr)
+
+
+def run_file(
+    path,
+    lexer: Lexer,
+    parser: Parser,
+    engine="tree",
+    opt_level=0,
+    dump_ast=False,
+    startup_report=False,
+    use_cache=True,
+    memory_report=False,
+):
+    """Run a MochaScript file, or print its optimized syntax tree."""
+    STARTUP["setup"] = time.perf_counter()
+    with open(path) as file:
+        source = file.read()
+    optimizer = Optimizer(opt_level)
+    options = f"O{opt_level}"
+
+    if dump_ast:
+        if ast := parse_source(source, lexer, parser, optimizer):
+            print(format_tree(ast))
+        for name, count in optimizer.stats.items():
+            print(f"# {name}: {count}")
+        return
+    if memory_report:
+        tracemalloc.start()
+
+    def run(statement):
+        # For streamed programs, "parse" and "first eval" mark when the first statement is ready and done
+        STARTUP.setdefault("parse", time.perf_counter())
+        evaluate(statement, engine)
+        STARTUP.setdefault("first eval", time.perf_counter())
+
+    try:
+        if engine == "py":
+            # Warm runs reuse the transpiled code object and skip parsing entirely
+            program = load_cached(path, source, options) if use_cache else None
+            if program is None:
+                ast = parse_source(source, lexer, parser, optimizer)
+                if not ast:
+                    return
+                program = Transpiler().transpile(ast, path)
+                if use_cache:
+                    store_cached(path, source, program, options)
+            STARTUP["parse"] = time.perf_counter()
+            program.run()
+            return
+
+        # Warm runs read the parsed and optimized statements back from the cache; a corrupt entry is a miss
+        statements = cache.load_program(path, source, options) if use_cache else None
+        if statements is not None:
+            for statement in statements:
+                run(statement)
+            return
+
+        writer = cache.ProgramWriter(cache.program_path(path, source, options)) if use_cache else None
+        complete = False
+        try:
+            complete = stream_source(source, lexer, parser, optimizer, run, writer)
+        finally:
+            if writer:
+                writer.close(commit=complete)
+    finally:
+        # Reports go to stderr after the program's own output
+        OUTPUT.flush(wait=True)
+        STARTUP.setdefault("parse", time.perf_counter())
+        STARTUP.setdefault("first eval", time.perf_counter())
+        if startup_report:
+            report_startup()
+        if memory_report:
+            report_memory()
+            tracemalloc.stop()
+
+
+def shell(lexer: Lexer, parser: Parser, engine="tree", opt_level=0):
     """Start the interactive shell."""
     while True:
-        source = input(PROMPT).strip()
+        source = OUTPUT.ask(PROMPT).strip()
         if not source:
             continue
 
         if not source.endswith(";"):
             source += ";"
 
-        tokens = lexer.tokenize(source)
-
-        if ast := parser.parse(tokens):
-            result = ast.visit()
+        if ast := parse_source(source, lexer, parser, Optimizer(opt_level)):
+            result = evaluate(ast, engine)
             # Uncomment next line for debugging purposes
             # print(ast)
-            print(result.repr())
+            OUTPUT.say(result.repr())
 
 
 if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="MochaScript interpreter")
+    arg_parser.add_argument("file", nargs="?", help="script to run; starts the shell if omitted")
+    arg_parser.add_argument("--engine", choices=ENGINES, default="tree", help="execution engine")
+    arg_parser.add_argument("--opt-level", type=int, choices=sorted(Optimizer.LEVELS), default=0, help="optimization level")
+    arg_parser.add_argument("--dump-ast", action="store_true", help="print the optimized syntax tree instead of running")
+    arg_parser.add_argument("--startup-report", action="store_true", help="print the time spent in each startup phase")
+    arg_parser.add_argument("--memory-report", action="store_true", help="print object sizes and memory use after running")
+    arg_parser.add_argument("--buffer-size", type=int, default=BUFFER_SIZE, help="characters of output to hold back")
+    arg_parser.add_argument("--flush", choices=POLICIES, help="when to write output; lines on a terminal, chunks otherwise")
+    arg_parser.add_argument("--background-writer", action="store_true", help="write output on a separate thread")
+    arg_parser.add_argument("--no-cache", action="store_true", help="neither read nor write cached programs")
+    arg_parser.add_argument("--clear-cache", action="store_true", help="remove the cached programs next to the script first")
+    args = arg_parser.parse_args()
+
+    OUTPUT.configure(args.buffer_size, args.flush, background=args.background_writer)
     lexer, parser = Lexer(), Parser()
-    if len(sys.argv) >= 2:
-        with open(sys.argv[1]) as source:
-            tokens = lexer.tokenize(source.read())
-            ast = parser.parse(tokens)
-            ast.visit() if ast else ...
-    else:
-        print("Starting interactive MochaScript interpreter.")
-        shell(lexer, parser)
+    try:
+        if args.file:
+            if args.clear_cache:
+                cache.clear(args.file)
+            run_file(
+                args.file,
+                lexer,
+                parser,
+                args.engine,
+                args.opt_level,
+                args.dump_ast,
+                args.startup_report,
+                not args.no_cache,
+                args.memory_report,
+            )
+            # The statements before a syntax error have run, but the script as a whole failed
+            if parser.errors:
+                sys.exit(1)
+        else:
+            print("Starting interactive MochaScript interpreter.")
+            shell(lexer, parser, args.engine, args.opt_level)
+    finally:
+        # Whatever the program said comes before a traceback, which is only printed after this
+        OUTPUT.flush(wait=True)
@@ -1,3 +1,19 @@
+import copy
+import json
+import operator
+import re
+import sys
+from array import array
+from functools import lru_cache, partial
+from itertools import islice, repeat
+
+try:
+    import numpy
+except ImportError:
+    # Vectors fall back to array.array and map() without NumPy
+    numpy = None
+
+from output import ask, say
 from utils import *
 
 BINOP_TO_FUNC_MAP = {
@@ -26,7 +42,12 @@ UNOP_TO_FUNC_MAP = {
 
 
 class BaseObject:
-    """Base class for all objects in MochaScript."""
+    """Base class for all objects in MochaScript.
+
+    Objects keep their attributes in `__slots__` rather than a per-instance dictionary.
+    """
+
+    __slots__ = ()
 
     def add(self, other):
         return self.visit().add(other.visit())
@@ -89,27 +110,55 @@ class BaseObject:
         return self.__class__.__name__
 
     def __repr__(self):
-        return self.__class__.__name__ + str({k: v for k, v in self.__dict__.items() if not k.startswith("__")})
+        return self.__class__.__name__ + str(attributes(self))
 
     def __eq__(self, other):
-        return self.__dict__ == other.__dict__ and type(self) == type(other)
+        return type(self) == type(other) and attributes(self) == attributes(other)
 
 
 class Atom(BaseObject):
     """Base class for all atoms- i.e. objects that have a "value" attribute"""
 
+    __slots__ = ("value",)
+
+    def __eq__(self, other):
+        return type(self) == type(other) and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
 
 class Number(Atom):
-    """Number class for MochaScript."""
+    """Number class for MochaScript.
+
+    Whole numbers are exact Python ints of any size, and become floats only in operations
+    with a fraction or a division that leaves a remainder. Numbers are never changed once
+    made, so small whole numbers are made once and shared.
+    """
 
-    def __init__(self, value):
-        self.value = float(value)
+    __slots__ = ()
+
+    def __new__(cls, value):
+        if type(value) is int:
+            number = SMALL_NUMBERS.get(value)
+            if number is not None:
+                return number
+        elif type(value) is not float:
+            return Number(to_number(value))
+        number = object.__new__(cls)
+        number.value = value
+        return number
+
+    def __reduce__(self):
+        return Number, (self.value,)
 
     def add(self, other):
         if isinstance(other, Number):
             return Number(self.value + other.value)
         elif isinstance(other, SpecialExpression):
             return self.add(other.visit())
+        elif type(other) is Vector:
+            return other.operate(self, operator.add, reflected=True)
         abort(f"Invalid types for operation: Number and {type(other).__name__}")
 
     def sub(self, other):
@@ -117,6 +166,8 @@ class Number(Atom):
             return Number(self.value - other.value)
         elif isinstance(other, SpecialExpression):
             return self.sub(other.visit())
+        elif type(other) is Vector:
+            return other.operate(self, operator.sub, reflected=True)
         abort(f"Invalid types for operation: Number and {type(other).__name__}")
 
     def mul(self, other):
@@ -124,6 +175,8 @@ class Number(Atom):
             return Number(self.value * other.value)
         elif isinstance(other, SpecialExpression):
             return self.mul(other.visit())
+        elif type(other) is Vector:
+            return other.operate(self, operator.mul, reflected=True)
         abort(f"Invalid types for operation: Number and {type(other).__name__}")
 
     def exp(self, other):
@@ -131,13 +184,17 @@ class Number(Atom):
             return Number(self.value**other.value)
         elif isinstance(other, SpecialExpression):
             return self.exp(other.visit())
+        elif type(other) is Vector:
+            return other.operate(self, operator.pow, reflected=True)
         abort(f"Invalid types for operation: Number and {type(other).__name__}")
 
     def div(self, other):
         if isinstance(other, Number):
-            return Number(self.value / other.value)
+            return Number(divide(self.value, other.value))
         elif isinstance(other, SpecialExpression):
             return self.div(other.visit())
+        elif type(other) is Vector:
+            return other.operate(self, operator.truediv, reflected=True)
         abort(f"Invalid types for operation: Number and {type(other).__name__}")
 
     def mod(self, other):
@@ -145,8 +202,25 @@ class Number(Atom):
             return Number(self.value % other.value)
         elif isinstance(other, SpecialExpression):
             return self.mod(other.visit())
+        elif type(other) is Vector:
+            return other.operate(self, operator.mod, reflected=True)
         abort(f"Invalid types for operation: Number and {type(other).__name__}")
 
+    def compare(self, other, compare, fallback):
+        """Compare with each element of a Vector, or with anything else the way `fallback` does."""
+        if isinstance(other, SpecialExpression):
+            other = other.visit()
+        if type(other) is Vector:
+            return other.operate(self, compare, reflected=True)
+        return fallback(self, other)
+
+    lt = lambda self, other: self.compare(other, operator.lt, BaseObject.lt)
+    gt = lambda self, other: self.compare(other, operator.gt, BaseObject.gt)
+    le = lambda self, other: self.compare(other, operator.le, BaseObject.le)
+    ge = lambda self, other: self.compare(other, operator.ge, BaseObject.ge)
+    eq = lambda self, other: self.compare(other, operator.eq, BaseObject.eq)
+    ne = lambda self, other: self.compare(other, operator.ne, BaseObject.ne)
+
     def pos(self):
         return Number(abs(self.value))
 
@@ -154,23 +228,100 @@ class Number(Atom):
         return Number(-self.value)
 
     def repr(self):
-        return (str(self.value)[:-2] if self.value % 1 == 0 else str(self.value)) if self.value else "0"
+        # Whole floats print like ints
+        if type(self.value) is float and self.value.is_integer():
+            return str(int(self.value))
+        return str(self.value)
 
     str = repr
 
 
+# Shared instances of the whole numbers that counters and loops produce most
+SMALL_NUMBERS = {}
+SMALL_NUMBERS.update({n: Number(n) for n in range(-128, 1025)})
+
+
+def to_number(value):
+    """The int or float for a number literal or another Python value."""
+    if isinstance(value, str):
+        return int(value) if value.isdigit() else float(value)
+    return int(value) if isinstance(value, int) else float(value)
+
+
+def divide(left, right):
+    """`left / right`, kept exact when both are ints and the division leaves no remainder."""
+    if type(left) is int and type(right) is int and right and not left % right:
+        return left // right
+    return left / right
+
+
 class Array(Atom):
-    """Array/list class for MochaScript."""
+    """Array/list class for MochaScript.
+
+    Arrays whose elements are all Numbers are made as NumberArrays, which store them compactly.
+
+    Arrays never change, so they can share their storage: an array is the items of a list
+    at the `positions` in a range. Appending to an array that ends at the end of its list
+    adds to the list in place, and slicing or reversing an array only makes a new range.
+    """
+
+    __slots__ = ("items", "positions")
+
+    def __new__(cls, values=None):
+        if cls is not Array:
+            return object.__new__(cls)
+        # The storage is picked from the visited elements, so variables and expressions can be compact too
+        items = [value.visit() for value in values] if values else []
+        numbers = number_buffer(items) if items else None
+        return Array.of(items) if numbers is None else NumberArray.of(numbers)
 
     def __init__(self, values=None):
-        if values is None:
-            values = []
-        self.value = [value.visit() for value in values]
+        # Made by __new__, which visits the elements once
+        pass
+
+    @classmethod
+    def of(cls, items, positions=None):
+        """The array of `items` at `positions`, all of them by default, without copying or visiting them."""
+        result = object.__new__(cls)
+        result.items = items
+        result.positions = range(len(items)) if positions is None else positions
+        return result
+
+    @property
+    def value(self):
+        if self.positions.step == 1 and len(self.positions) == len(self.items):
+            return self.items
+        return window(self.items, self.positions)
+
+    def __reduce__(self):
+        # Only the elements the array can see are stored, not the rest of a list it shares
+        return Array.of, (list(self.value),)
+
+    def grow(self, values):
+        """This array with `values` added, sharing its items if nothing follows them."""
+        items, start = self.items, self.positions.start
+        if self.positions.step != 1 or self.positions.stop != len(items):
+            items, start = window(items, self.positions), 0
+        items.extend(values)
+        return type(self).of(items, range(start, len(items)))
+
+    def slice(self, start, end):
+        """The elements from `start` up to `end`, counting like Python slices."""
+        positions = self.positions[start:end]
+        # A small slice of a large array is copied, so it does not keep all of the array alive
+        if len(positions) * SLICE_SHARE_RATIO < len(self.items):
+            return type(self).of(window(self.items, positions))
+        return type(self).of(self.items, positions)
 
     def add(self, other):
-        if isinstance(other, Array):
-            return Array(self.value.extend(other.value))
+        if isinstance(other, Array) and type(other) is not String:
+            if type(self) is Array and self.positions:
+                return self.grow(other)
+            return Array(self.value + other.value)
         elif isinstance(other, Atom):
+            if type(self) is Array and self.positions:
+                return self.grow((other.visit(),))
+            # Empty arrays and compact arrays that cannot hold `other` start over as a new array
             return Array(self.value + [other.visit()])
         elif isinstance(other, SpecialExpression):
             return self.add(other.visit())
@@ -194,31 +345,183 @@ class Array(Atom):
 
     def div(self, other):
         if isinstance(other, Number):
-            return self.value[int(other.value)]
+            # Indexing the range checks the index, and turns negative ones into positions
+            return self.items[self.positions[int(other.value)]]
         elif isinstance(other, SpecialExpression):
             return self.div(other.visit())
         abort(f"Invalid types for operation: Array and {type(other).__name__}")
 
     def contains(self, other):
-        return Boolean(vars(other) in [vars(item) for item in self.value])
+        return Boolean(other in self.value)
+
+    def __iter__(self):
+        # Stops at the end of the positions even if a longer array adds to the shared items meanwhile
+        if self.positions.step == 1:
+            return islice(self.items, self.positions.start, self.positions.stop)
+        return map(self.items.__getitem__, self.positions)
+
+    def __eq__(self, other):
+        # Arrays are equal to arrays with the same elements, however either one stores them
+        return isinstance(other, Array) and type(other) is not String and self.value == other.value
+
+    def __hash__(self):
+        # Arrays are never changed once made; a tuple of Numbers hashes like the tuple of their values
+        return hash(tuple(self.value))
 
     def neg(self):
-        return Array(self.value[::-1])
+        return type(self).of(self.items, self.positions[::-1])
 
     def repr(self):
         return f"[{', '.join((value.repr() for value in self.value))}]"
 
 
+# Slices shorter than 1 / SLICE_SHARE_RATIO of the items they come from are copied
+SLICE_SHARE_RATIO = 4
+
+
+def window(items, positions):
+    """A copy of the items at `positions`, a range, as a list or machine array like `items`."""
+    if not positions:
+        return items[:0]
+    # Slices take a stop below 0 to mean "from the end", not "past the start"
+    return items[positions.start : positions.stop if positions.stop >= 0 else None : positions.step]
+
+
+def number_buffer(values):
+    """The values of `values` in one machine array, or None unless they are all Numbers that fit one.
+
+    Ints and floats never share a buffer, since a float buffer would turn the ints into floats.
+    """
+    numbers = []
+    for value in values:
+        if type(value) is not Number:
+            return None
+        numbers.append(value.value)
+    try:
+        return array("q", numbers)
+    except TypeError:
+        if all(type(number) is float for number in numbers):
+            return array("d", numbers)
+    except OverflowError:
+        pass
+    return None
+
+
+class NumberArray(Array):
+    """Array of Numbers stored as machine ints or floats in one contiguous buffer.
+
+    Operations without a cheaper way to work on the buffer use `value`, which lists the Numbers.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, values=None):
+        # Made by Array.__new__ or `of`, which fill in the buffer
+        pass
+
+    @property
+    def numbers(self):
+        """The machine array of the numbers, which is a copy if the array shares its items."""
+        return Array.value.fget(self)
+
+    @property
+    def value(self):
+        return [Number(n) for n in self.numbers]
+
+    def __reduce__(self):
+        return Array, (self.value,)
+
+    def __iter__(self):
+        return map(Number, Array.__iter__(self))
+
+    def __eq__(self, other):
+        if type(other) is NumberArray:
+            return self.numbers == other.numbers
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(tuple(self.numbers))
+
+    def add(self, other):
+        numbers = number_buffer([other]) if type(other) is Number else None
+        if type(other) is NumberArray:
+            numbers = other.numbers
+        if numbers is not None:
+            try:
+                # Fails without adding anything unless the buffers are both ints or both floats
+                return self.grow(numbers)
+            except TypeError:
+                pass
+        return super().add(other)
+
+    def mul(self, other):
+        if isinstance(other, Number):
+            return NumberArray.of(self.numbers * int(other.value))
+        return super().mul(other)
+
+    def div(self, other):
+        if isinstance(other, Number):
+            return Number(self.items[self.positions[int(other.value)]])
+        return super().div(other)
+
+    def contains(self, other):
+        return Boolean(type(other) is Number and other.value in self.numbers)
+
+    def repr(self):
+        return f"[{', '.join(Number(n).repr() for n in self.numbers)}]"
+
+
 class String(Array):
-    """String class for MochaScript."""
+    """String class for MochaScript.
+
+    A long string made by concatenation starts out as a list of pieces, shared with the
+    strings made by adding to it the way arrays share their items. This makes building a
+    string in a loop linear. The pieces are joined the first time the text is needed.
+    """
+
+    __slots__ = ()
+
+    # The joined text, in the slot that Array replaces with its `value` property; None until joined
+    text = Atom.value
 
     def __init__(self, value=""):
-        self.value = value.strip('"').replace(r"\n", "\n").replace(r"\t", "\t").replace(r"\\", "\\")
+        self.text = value
+        self.positions = None
+
+    @classmethod
+    def of(cls, items, positions=None):
+        """The String of the pieces `items` at `positions`, joined when first needed."""
+        result = super().of(items, positions)
+        result.text = None
+        return result
+
+    @property
+    def value(self):
+        if self.text is None:
+            self.text = "".join(window(self.items, self.positions))
+        return self.text
+
+    def __reduce__(self):
+        return String, (self.value,)
+
+    def slice(self, start, end):
+        return String(self.value[start:end])
+
+    def __iter__(self):
+        return iter(self.value)
+
+    def contains(self, other):
+        return Boolean(type(other) is String and other.value in self.value)
 
     def add(self, other):
         if isinstance(other, SpecialExpression):
             return self.add(other.visit())
-        return String(self.value + other.str())
+        piece = other.str()
+        if self.positions is not None:
+            return self.grow((piece,))
+        if len(self.text) + len(piece) <= FLAT_STRING_LIMIT:
+            return String(self.text + piece)
+        return String.of([self.text, piece])
 
     def sub(self, other):
         if isinstance(other, SpecialExpression):
@@ -234,7 +537,8 @@ class String(Array):
 
     def div(self, other):
         if isinstance(other, Number):
-            return String(self.value[int(other.value)])
+            character = self.value[int(other.value)]
+            return CHARACTERS.get(character) or String(character)
         elif isinstance(other, SpecialExpression):
             return self.div(other.visit())
         abort(f"Invalid types for operation: String and {type(other).__name__}")
@@ -242,7 +546,15 @@ class String(Array):
     def mod(self, other):
         if isinstance(other, SpecialExpression):
             return self.mod(other.visit())
-        return String(self.value.replace("{}", other.str()))
+        literals, fields, template = format_template(self.value)
+        if not fields:
+            return self
+        if isinstance(other, Array) and type(other) is not String:
+            other = list(other)
+        elif type(other) is not Map and type(other) is not Record:
+            # One value fills every field
+            return String(other.str().join(literals))
+        return String(template.format(*[format_argument(other, field).str() for field in fields]))
 
     def lt(self, other):
         return Boolean(len(self.visit().value) < len(other.visit().value))
@@ -265,45 +577,189 @@ class String(Array):
     def repr(self):
         return f'"{self.value}"'
 
+    __eq__ = Atom.__eq__
+    __hash__ = Atom.__hash__
+
+
+# `{}`, `{0}` or `{name}` in a format string
+FORMAT_FIELD = re.compile(r"\{(\w*)\}")
+
+
+@lru_cache(maxsize=256)
+def format_template(text):
+    """The text between the fields of a format string, its fields, and a Python format string taking their values.
+
+    `{}` fields take positions counting up from 0, `{1}` fields give a position and `{name}` fields a name.
+    """
+    pieces = FORMAT_FIELD.split(text)
+    literals = pieces[::2]
+    fields, position = [], 0
+    for name in pieces[1::2]:
+        if name:
+            fields.append(int(name) if name.isdigit() else name)
+        else:
+            fields.append(position)
+            position += 1
+    template = "{}".join(literal.replace("{", "{{").replace("}", "}}") for literal in literals)
+    return tuple(literals), tuple(fields), template
+
+
+def format_argument(arguments, field):
+    """The value for a format field from a list of arguments, a Map or a Record."""
+    if type(arguments) is list:
+        if type(field) is not int or field >= len(arguments):
+            abort(f"No argument for format field {{{field}}}")
+        return arguments[field]
+    if type(arguments) is Map:
+        value = arguments.value.get(Number(field) if type(field) is int else String(field))
+        if value is None:
+            abort(f"No argument for format field {{{field}}}")
+        return value
+    return arguments.getattr(str(field))
+
+
+# Concatenations up to this many characters are copied into one string instead of kept as pieces
+FLAT_STRING_LIMIT = 256
+
+# Strings of one ASCII character, which indexing a String returns instead of making new ones
+CHARACTERS = {chr(code): String(chr(code)) for code in range(128)}
+
+
+class Range(Array):
+    """The whole numbers from `start` to `end`, made one at a time as they are used.
+
+    Operations without a cheaper way to work on a range use `value`, which lists the numbers.
+    """
+
+    __slots__ = ("numbers",)
+
+    def __new__(cls, start, end):
+        return object.__new__(cls)
+
+    def __init__(self, start, end):
+        self.numbers = range(start, end + 1)
+
+    @classmethod
+    def of(cls, numbers):
+        """The Range over the Python range `numbers`, which may go down or skip numbers."""
+        result = object.__new__(cls)
+        result.numbers = numbers
+        return result
+
+    @property
+    def value(self):
+        return [Number(n) for n in self.numbers]
+
+    def __reduce__(self):
+        return Range.of, (self.numbers,)
+
+    def __iter__(self):
+        return map(Number, self.numbers)
+
+    def __eq__(self, other):
+        if type(other) is Range:
+            return self.numbers == other.numbers
+        return super().__eq__(other)
+
+    def __hash__(self):
+        return hash(tuple(self.numbers))
+
+    def slice(self, start, end):
+        return Range.of(self.numbers[start:end])
+
+    def to_array(self):
+        """The numbers of the range as a real Array."""
+        try:
+            return NumberArray.of(array("q", self.numbers))
+        except OverflowError:
+            return Array(self.value)
+
+    def add(self, other):
+        return self.to_array().add(other)
+
+    def sub(self, other):
+        return self.to_array().sub(other)
+
+    def mul(self, other):
+        return self.to_array().mul(other)
+
+    def neg(self):
+        return Range.of(self.numbers[::-1])
+
+    def div(self, other):
+        if isinstance(other, Number):
+            return Number(self.numbers[int(other.value)])
+        return super().div(other)
+
+    def contains(self, other):
+        value = other.value if type(other) is Number else None
+        if type(value) is float and value.is_integer():
+            value = int(value)
+        return Boolean(type(value) is int and value in self.numbers)
+
 
 class Boolean(Atom):
-    """Boolean class for MochaScript."""
+    """Boolean class for MochaScript. There are only two booleans, TRUE and FALSE."""
+
+    __slots__ = ()
+
+    def __new__(cls, value=True):
+        return TRUE if value else FALSE
 
-    def __init__(self, value=True):
-        self.value = bool(value)
+    def __reduce__(self):
+        return Boolean, (self.value,)
 
     def repr(self):
         return str(self.value).lower()
 
 
+TRUE, FALSE = object.__new__(Boolean), object.__new__(Boolean)
+TRUE.value, FALSE.value = True, False
+
+
 class Function(Atom):
     """Function class for MochaScript."""
 
-    def __init__(self, body, parameters, closure_env=None, name=None):
+    __slots__ = ("body", "parameters", "closure", "scope", "name")
+
+    def __init__(self, body, parameters, closure=None, name=None):
         self.body = body
         self.parameters = parameters
-        self.closure_env = closure_env or {}
+        # Cells of the enclosing calls' variables, for functions nested in other functions
+        self.closure = closure
+        self.scope = None
         self.name = name
         self.value = self.repr()
 
     def repr(self):
         return f"<function {self.name}>" if self.name else "<anonymous function>"
 
+    def visit(self):
+        # A nested function literal makes a new function each time, closing over the current call
+        if self.closure is None and self.scope is not None and self.scope.enclosing is not None:
+            function = copy.copy(self)
+            function.closure = capture(FRAMES[-1], self.scope)
+            return function
+        return self
+
     def call(self, arguments):
         """Call the function with arguments"""
-        # Append the passed arguments to the environment
-        _assignments = [k.visit() for k in arguments.keys() if isinstance(k, AssignmentNode)]
-        arguments = {k: v for k, v in arguments.items() if not isinstance(k, AssignmentNode)}
-        updated_args = {**ENV[-1], **self.closure_env, **arguments}
-        ENV.append(MSEnv(**updated_args))
-        # Get the result of the function
-        result = self.body.visit()
-        if isinstance(result, Function):
-            result.closure_env = ENV[-1]
-        # Remove the arguments from the environment
-        ENV.pop()
+        result = self.run(arguments)
+        # Calls in tail position come back here instead of nesting, so tail recursion runs in constant stack
+        while type(result) is TailCall:
+            result = result.function.run(result.arguments)
         return result
 
+    def run(self, arguments):
+        """Run the body once; a call in tail position is returned as a TailCall for `call` to make."""
+        if self.scope is None:
+            resolve(self)
+        FRAMES.append(Frame(self.scope, self.closure, [arguments.get(name) for name in self.parameters]))
+        try:
+            return self.body.visit()
+        finally:
+            FRAMES.pop()
+
     add = lambda self, other: abort(f"Invalid types for operation: Function and {type(other).__name__}")
     sub = add
     mul = add
@@ -321,30 +777,693 @@ class Function(Atom):
     pos = lambda self: abort(f"Invalid type for operation: Function")
     neg = pos
 
+    __eq__ = BaseObject.__eq__
+
+
+class Builtin(Atom):
+    """Function implemented in Python."""
+
+    __slots__ = ("parameters", "function")
+
+    def __init__(self, name, parameters, function):
+        self.parameters = parameters
+        self.function = function
+        self.value = f"<builtin {name}>"
+
+    def call(self, arguments):
+        """Call the function with arguments"""
+        return self.function(*(arguments.get(name) for name in self.parameters))
+
+
+class TailCall:
+    """A call whose result is the result of the calling function, made after that call has returned."""
+
+    __slots__ = ("function", "arguments")
+
+    def __init__(self, function, arguments):
+        self.function = function
+        self.arguments = arguments
+
+
+class Set(Atom):
+    """Set class for MochaScript.
+
+    The elements are the keys of a dict, so adding, removing and membership take constant
+    time and the elements keep the order they were added in. Numbers, strings, booleans
+    and arrays of them can be elements.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, values=()):
+        self.value = {}
+        for value in values:
+            self.insert(value)
+
+    @classmethod
+    def of(cls, values):
+        """The Set of the elements of an Array or another Set, or of the keys of a Map."""
+        if not isinstance(values, ITERABLES) or type(values) is String:
+            abort(f"Cannot make a set from {values.type()}")
+        return Set(values)
+
+    def copy(self):
+        result = Set()
+        result.value = self.value.copy()
+        return result
+
+    def insert(self, value):
+        try:
+            self.value[value] = None
+        except TypeError:
+            abort(f"{value.type()} cannot be in a set")
+        return self
+
+    def remove(self, value):
+        if not self.contains(value).value:
+            abort(f"{value.repr()} is not in the set")
+        del self.value[value]
+        return self
+
+    def add(self, other):
+        if isinstance(other, SpecialExpression):
+            return self.add(other.visit())
+        result = self.copy()
+        if type(other) is Set:
+            result.value.update(other.value)
+            return result
+        return result.insert(other)
+
+    def sub(self, other):
+        if isinstance(other, SpecialExpression):
+            return self.sub(other.visit())
+        result = self.copy()
+        for value in other if type(other) is Set else [other]:
+            if self.contains(value).value:
+                del result.value[value]
+        return result
+
+    mul = lambda self, other: abort(f"Invalid types for operation: Set and {type(other).__name__}")
+    div = mul
+    mod = mul
+
+    def contains(self, other):
+        try:
+            return Boolean(other in self.value)
+        except TypeError:
+            return Boolean(False)
+
+    def getattr(self, other):
+        if other == "length":
+            return Number(len(self.value))
+        if other == "add":
+            return Builtin("add", ["value"], self.insert)
+        if other == "remove":
+            return Builtin("remove", ["value"], self.remove)
+        abort(f"Sets have no attribute '{other}'")
+
+    def __iter__(self):
+        # Loops may add to the set they go over, so they go over the elements it had to begin with
+        return iter(list(self.value))
+
+    def __eq__(self, other):
+        return type(other) is Set and self.value.keys() == other.value.keys()
+
+    def repr(self):
+        if not self.value:
+            return "set([])"
+        return f"{{{', '.join(value.repr() for value in self.value)}}}"
+
+    str = repr
+
+
+class Map(Atom):
+    """Hash map class for MochaScript.
+
+    Keys can be any value a Set can hold, and are found in constant time. `map / key`
+    looks a key up, and loops go over the keys in the order they were added.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, items=()):
+        self.value = {}
+        for key, value in items:
+            self.insert(key, value)
+
+    @classmethod
+    def of(cls, keys, values):
+        """The Map from the elements of one Array to the elements at the same places in another."""
+        if not isinstance(keys, (Array, Set)) or not isinstance(values, Array) or String in (type(keys), type(values)):
+            abort("map() needs an array of keys and an array of values")
+        keys, values = list(keys), list(values)
+        if len(keys) != len(values):
+            abort("map() needs as many values as keys")
+        result = Map()
+        try:
+            # One dict construction instead of one insertion per key
+            result.value = dict(zip(keys, values))
+        except TypeError:
+            abort("Keys of a map must be numbers, strings, booleans or arrays of them")
+        return result
+
+    def copy(self):
+        result = Map()
+        result.value = self.value.copy()
+        return result
+
+    def insert(self, key, value):
+        try:
+            self.value[key] = value
+        except TypeError:
+            abort(f"{key.type()} cannot be a key of a map")
+        return self
+
+    def delete(self, key):
+        if not self.contains(key).value:
+            abort(f"{key.repr()} is not a key of the map")
+        del self.value[key]
+        return self
+
+    def get(self, key, default):
+        try:
+            return self.value.get(key, default if default is not None else Boolean(False))
+        except TypeError:
+            abort(f"{key.type()} cannot be a key of a map")
+
+    def add(self, other):
+        if isinstance(other, SpecialExpression):
+            return self.add(other.visit())
+        if type(other) is not Map:
+            abort(f"Invalid types for operation: Map and {type(other).__name__}")
+        result = self.copy()
+        result.value.update(other.value)
+        return result
+
+    def sub(self, other):
+        if isinstance(other, SpecialExpression):
+            return self.sub(other.visit())
+        result = self.copy()
+        if self.contains(other).value:
+            del result.value[other]
+        return result
+
+    def div(self, other):
+        if isinstance(other, SpecialExpression):
+            return self.div(other.visit())
+        try:
+            return self.value[other]
+        except KeyError:
+            abort(f"{other.repr()} is not a key of the map")
+        except TypeError:
+            abort(f"{other.type()} cannot be a key of a map")
+
+    mul = lambda self, other: abort(f"Invalid types for operation: Map and {type(other).__name__}")
+    mod = mul
+
+    def contains(self, other):
+        try:
+            return Boolean(other in self.value)
+        except TypeError:
+            return Boolean(False)
+
+    def getattr(self, other):
+        if other == "length":
+            return Number(len(self.value))
+        if other == "keys":
+            return Array(list(self.value))
+        if other == "values":
+            return Array(list(self.value.values()))
+        if other == "get":
+            return Builtin("get", ["key", "default"], self.get)
+        if other == "set":
+            return Builtin("set", ["key", "value"], self.insert)
+        if other == "delete":
+            return Builtin("delete", ["key"], self.delete)
+        # Other names look up string keys, so `{"a": 1}.a` is 1
+        if String(other) in self.value:
+            return self.value[String(other)]
+        abort(f"Maps have no attribute '{other}'")
+
+    def __iter__(self):
+        # Loops may change the map they go over, so they go over the keys it had to begin with
+        return iter(list(self.value))
+
+    def __eq__(self, other):
+        return type(other) is Map and self.value == other.value
+
+    def repr(self):
+        return f"{{{', '.join(f'{key.repr()}: {value.repr()}' for key, value in self.value.items())}}}"
+
+    str = repr
+
+
+class Struct(Atom):
+    """Record type made by `struct (x, y)`; calling it makes a Record with those fields.
 
-class Object(Atom):
-    def __init__(self, namespace=None):
-        self.namespace = namespace or {}
+    The struct is also the shape of its records. It knows the position of each field,
+    so a record only stores the field values, in order.
+    """
+
+    __slots__ = ("parameters", "offsets", "name")
+
+    def __init__(self, fields, name=None):
+        if len(set(fields)) != len(fields):
+            abort("Fields of a struct must have different names")
+        self.parameters = list(fields)
+        self.offsets = {field: index for index, field in enumerate(fields)}
+        self.name = name
         self.value = self.repr()
 
+    def call(self, arguments):
+        """Make a record from the field values"""
+        fields = tuple(arguments.get(field) for field in self.parameters)
+        if None in fields:
+            abort(f"{self.repr()} needs {len(self.parameters)} field values")
+        return Record(self, fields)
+
+    def offset(self, name):
+        """Position of the field `name` in records of this struct."""
+        offset = self.offsets.get(name)
+        if offset is None:
+            abort(f"{self.repr()} has no field '{name}'")
+        return offset
+
+    def repr(self):
+        return f"<struct {self.name or ''}({', '.join(self.parameters)})>"
+
+    # Every struct definition is a type of its own
+    __eq__ = object.__eq__
+    __hash__ = object.__hash__
+
+
+class Record(Atom):
+    """Value made by calling a struct. Its fields can be read but not changed."""
+
+    __slots__ = ("shape",)
+
+    def __init__(self, shape, fields):
+        self.shape = shape
+        self.value = fields
+
+    def getattr(self, other):
+        return self.value[self.shape.offset(other)]
+
+    add = lambda self, other: abort(f"Invalid types for operation: Record and {type(other).__name__}")
+    sub = add
+    mul = add
+    div = add
+    mod = add
+
+    def __eq__(self, other):
+        return type(other) is Record and self.shape is other.shape and self.value == other.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+    def repr(self):
+        fields = ", ".join(f"{name}={value.repr()}" for name, value in zip(self.shape.parameters, self.value))
+        return f"{self.shape.name or 'struct'}({fields})"
+
+    str = repr
+
+
+# Bytes buffered by file reads and writes
+FILE_BUFFER = 1024 * 1024
+
+
+class Stream(Atom):
+    """Lines or fixed-size chunks of a text file, read as a loop goes over them.
+
+    Only a buffer of the file is in memory at a time, so files far larger than memory
+    can be processed. Every loop reads the file again from the start.
+    """
+
+    __slots__ = ("size",)
+
+    def __init__(self, path, size=None):
+        self.value = path
+        self.size = size
+
+    @classmethod
+    def lines(cls, path):
+        """The lines of the file at `path`, without their line endings."""
+        if type(path) is not String:
+            abort("lines() needs a file path")
+        return Stream(path.value)
+
+    @classmethod
+    def chunks(cls, path, size):
+        """The file at `path`, `size` characters at a time."""
+        if type(path) is not String or type(size) is not Number or size.value < 1 or size.value % 1:
+            abort("chunks() needs a file path and a positive whole number")
+        return Stream(path.value, int(size.value))
+
+    def __iter__(self):
+        try:
+            # Bytes that are not UTF-8 are replaced, so one bad line cannot stop a loop over a large log
+            file = open(self.value, encoding="utf-8", errors="replace", buffering=FILE_BUFFER)
+        except OSError as error:
+            abort(f"Cannot read {self.value}: {error.strerror}")
+        return self.read(file)
+
+    def read(self, file):
+        with file:
+            if self.size is None:
+                for line in file:
+                    yield String(line.rstrip("\n"))
+            else:
+                for chunk in iter(partial(file.read, self.size), ""):
+                    yield String(chunk)
+
+    add = lambda self, other: abort(f"Invalid types for operation: Stream and {type(other).__name__}")
+    sub = add
+    mul = add
+    div = add
+    mod = add
+
     def getattr(self, other):
-        if self.namespace.get(other) is not None:
-            return self.namespace.get(other)
+        if other == "path":
+            return String(self.value)
+        abort(f"Streams have no attribute '{other}'")
+
+    def __eq__(self, other):
+        return type(other) is type(self) and self.value == other.value and self.size == other.size
+
+    def __hash__(self):
+        return hash((self.value, self.size))
+
+    def repr(self):
+        if self.size is None:
+            return f"lines({String(self.value).repr()})"
+        return f"chunks({String(self.value).repr()}, {self.size})"
+
+    str = repr
+
+
+class JsonStream(Stream):
+    """The values of a newline-delimited JSON file, decoded a line at a time as a loop goes over them."""
+
+    __slots__ = ()
+
+    @classmethod
+    def lines(cls, path):
+        if type(path) is not String:
+            abort("json_lines() needs a file path")
+        return JsonStream(path.value)
+
+    def read(self, file):
+        with file:
+            for number, line in enumerate(file, 1):
+                if line.isspace():
+                    continue
+                try:
+                    yield from_json(json.loads(line))
+                except json.JSONDecodeError as error:
+                    column = min(error.pos, len(line.rstrip())) + 1
+                    abort(f"Invalid JSON on line {number} of {self.value}: {error.msg} at column {column}")
+
+    def repr(self):
+        return f"json_lines({String(self.value).repr()})"
+
+    str = repr
+
+
+def save(path, values, mode):
+    """Write a String as it is, or the items of anything a loop can go over one per line."""
+    if type(path) is not String:
+        abort("Files can only be written to a file path")
+    if type(values) is not String and not isinstance(values, ITERABLES):
+        abort(f"Cannot write {values.type()} to a file")
+    try:
+        with open(path.value, mode, encoding="utf-8", buffering=FILE_BUFFER) as file:
+            if type(values) is String:
+                file.write(values.value)
+            else:
+                file.writelines(f"{value.str()}\n" for value in values)
+    except OSError as error:
+        abort(f"Cannot write {path.value}: {error.strerror}")
+    return values
+
+
+def write_file(path, values):
+    return save(path, values, "w")
+
+
+def append_file(path, values):
+    return save(path, values, "a")
+
+
+def from_json(data):
+    """The MochaScript value of data decoded by the json module; null becomes false."""
+    kind = type(data)
+    if kind is str:
+        return String(data)
+    if kind is int or kind is float:
+        return Number(data)
+    if kind is list:
+        values = [from_json(item) for item in data]
+        numbers = number_buffer(values) if values else None
+        return Array.of(values) if numbers is None else NumberArray.of(numbers)
+    if kind is dict:
+        result = Map()
+        result.value = {json_key_string(key): from_json(value) for key, value in data.items()}
+        return result
+    return Boolean(bool(data))
+
+
+@lru_cache(maxsize=1024)
+def json_key_string(key):
+    # The objects of a file mostly repeat the same keys, so their Strings are shared
+    return String(key)
+
+
+def to_json(value):
+    """The value as data the json module can encode."""
+    kind = type(value)
+    if kind is Number:
+        return json_number(value.value)
+    if kind is String or kind is Boolean:
+        return value.value
+    if kind is Range:
+        return list(value.numbers)
+    if kind is NumberArray:
+        numbers = value.numbers
+        return numbers.tolist() if numbers.typecode == "q" else [json_number(number) for number in numbers]
+    if kind is Map:
+        # JSON keys are strings, so number and boolean keys are written as text
+        return {key.value if type(key) is String else json_key(key): to_json(item) for key, item in value.value.items()}
+    if kind is Record:
+        return {name: to_json(field) for name, field in zip(value.shape.parameters, value.value)}
+    if kind is Vector:
+        return to_json(value.getattr("array"))
+    if isinstance(value, ITERABLES):
+        return [to_json(item) for item in value]
+    abort(f"Cannot convert {value.type()} to JSON")
+
+
+def json_number(number):
+    # Whole floats are written like integers, as they are printed
+    return int(number) if type(number) is float and number.is_integer() else number
+
+
+def json_key(key):
+    if type(key) is not Number and type(key) is not Boolean:
+        abort(f"Cannot use {key.type()} as a JSON key")
+    return json.dumps(key.value)
+
+
+def json_load(text):
+    if type(text) is not String:
+        abort("json_load() needs a string")
+    try:
+        return from_json(json.loads(text.value))
+    except json.JSONDecodeError as error:
+        abort(f"Invalid JSON: {error.msg} at line {error.lineno} column {error.colno}")
+
+
+def json_dump(value):
+    try:
+        return String(json.dumps(to_json(value), ensure_ascii=False, allow_nan=False))
+    except ValueError:
+        # JSON has no NaN or infinities
+        abort("Cannot convert NaN or infinite numbers to JSON")
+
+
+# Values a for-loop can go over
+ITERABLES = (Array, Set, Map, Stream)
+
+
+class Vector(Atom):
+    """Vector of floats whose arithmetic and comparisons work on all elements at once.
+
+    The elements are a NumPy array when NumPy is installed, and an array.array of doubles
+    otherwise. Comparisons give vectors of 1s and 0s. `vec(array)` makes a vector, and
+    `.array` turns one back into an Array.
+    """
+
+    __slots__ = ()
+
+    # Reductions by attribute name, for when NumPy is not installed; NumPy arrays have methods of these names
+    REDUCTIONS = {"sum": sum, "min": min, "max": max, "mean": lambda values: sum(values) / len(values)}
+
+    def __init__(self, values):
+        self.value = values
+
+    @classmethod
+    def of(cls, values):
+        """The Vector with the elements of an Array."""
+        if isinstance(values, Range):
+            if numpy is not None:
+                return Vector(numpy.arange(values.numbers.start, values.numbers.stop, values.numbers.step, dtype=float))
+            numbers = values.numbers
+        elif isinstance(values, NumberArray):
+            numbers = values.numbers
+        elif type(values) is Array and all(type(value) is Number for value in values.value):
+            numbers = [value.value for value in values.value]
+        elif type(values) is Vector:
+            return values
+        else:
+            abort(f"vec() needs an array of numbers, not {values.repr()}")
+        return Vector(numpy.array(numbers, dtype=float) if numpy is not None else array("d", numbers))
+
+    def to_array(self):
+        """The elements as a NumberArray."""
+        numbers = array("d")
+        if numpy is not None:
+            numbers.frombytes(numpy.ascontiguousarray(self.value, dtype=float).tobytes())
         else:
-            abort(f"Undefined variable '{other}'")
+            numbers.extend(self.value)
+        return NumberArray.of(numbers)
+
+    def operate(self, other, operate, reflected=False):
+        """Apply `operate` to each element and the matching element of `other`, or `other` if it is a Number."""
+        if isinstance(other, SpecialExpression):
+            other = other.visit()
+        if type(other) is Vector:
+            if len(other.value) != len(self.value):
+                abort("Vectors have different lengths")
+        elif type(other) is not Number:
+            abort(f"Invalid types for operation: Vector and {type(other).__name__}")
+        try:
+            if numpy is not None:
+                left, right = self.value, other.value
+                if reflected:
+                    left, right = right, left
+                with numpy.errstate(divide="raise", over="raise", invalid="raise"):
+                    return Vector(numpy.asarray(operate(left, right), dtype=float))
+            left, right = self.value, other.value if type(other) is Vector else repeat(other.value)
+            if reflected:
+                left, right = right, left
+            return Vector(array("d", map(operate, left, right)))
+        except (ArithmeticError, TypeError):
+            # TypeError: the fallback gets complex numbers from fractional powers of negative numbers
+            abort("Vector arithmetic failed: division by zero, overflow or no real result")
+
+    def apply(self, operate):
+        """Apply `operate` to each element."""
+        if numpy is not None:
+            return Vector(operate(self.value))
+        return Vector(array("d", map(operate, self.value)))
+
+    add = lambda self, other: self.operate(other, operator.add)
+    sub = lambda self, other: self.operate(other, operator.sub)
+    mul = lambda self, other: self.operate(other, operator.mul)
+    div = lambda self, other: self.operate(other, operator.truediv)
+    mod = lambda self, other: self.operate(other, operator.mod)
+    exp = lambda self, other: self.operate(other, operator.pow)
+    lt = lambda self, other: self.operate(other, operator.lt)
+    gt = lambda self, other: self.operate(other, operator.gt)
+    le = lambda self, other: self.operate(other, operator.le)
+    ge = lambda self, other: self.operate(other, operator.ge)
+    eq = lambda self, other: self.operate(other, operator.eq)
+    ne = lambda self, other: self.operate(other, operator.ne)
+
+    pos = lambda self: self.apply(abs)
+    neg = lambda self: self.apply(operator.neg)
+
+    def contains(self, other):
+        return Boolean(type(other) is Number and other.value in self.value)
+
+    def getattr(self, other):
+        if other == "array":
+            return self.to_array()
+        if other == "length":
+            return Number(len(self.value))
+        if other not in self.REDUCTIONS:
+            abort(f"Vectors have no attribute '{other}'")
+        if not len(self.value):
+            abort(f"Cannot take the {other} of an empty vector")
+        if numpy is not None:
+            return Number(float(getattr(self.value, other)()))
+        return Number(float(self.REDUCTIONS[other](self.value)))
+
+    def __eq__(self, other):
+        return type(other) is Vector and self.value.tolist() == other.value.tolist()
 
     def repr(self):
-        return str({k.repr(): v.repr() for k, v in self.namespace.items()})
+        return f"vec({self.to_array().repr()})"
 
     str = repr
 
 
+NUMBER_BINOPS = {
+    "+": (operator.add, Number),
+    "-": (operator.sub, Number),
+    "*": (operator.mul, Number),
+    "/": (divide, Number),
+    "%": (operator.mod, Number),
+    "**": (operator.pow, Number),
+    "==": (operator.eq, Boolean),
+    "!=": (operator.ne, Boolean),
+    "<": (operator.lt, Boolean),
+    ">": (operator.gt, Boolean),
+    "<=": (operator.le, Boolean),
+    ">=": (operator.ge, Boolean),
+}
+
+NUMBER_UNOPS = {
+    "+": abs,
+    "-": operator.neg,
+}
+
+
+def attributes(value):
+    """Attributes of `value` by name, whether they live in slots or in an attribute dictionary."""
+    names = SLOT_NAMES.get(type(value))
+    if names is None:
+        names = SLOT_NAMES[type(value)] = [
+            name for cls in reversed(type(value).__mro__) for name in cls.__dict__.get("__slots__", ())
+        ]
+    result = {name: getattr(value, name) for name in names if hasattr(value, name)}
+    result.update(getattr(value, "__dict__", {}))
+    return result
+
+
+SLOT_NAMES = {}
+
+
+def object_size(value):
+    """Bytes taken by `value` itself, including its attribute dictionary if it has one."""
+    return sys.getsizeof(value) + (sys.getsizeof(value.__dict__) if hasattr(value, "__dict__") else 0)
+
+
 class SpecialExpression(BaseObject):
     """Special expression base class for MochaScript."""
 
+    __slots__ = ()
+
 
 class BinOp(SpecialExpression):
-    """Binary operation class for MochaScript."""
+    """Binary operation class for MochaScript.
+
+    The first evaluation rewrites the node into a specialized subclass based on the
+    operand types it sees. Specialized nodes check a cheap type guard and fall back
+    to GenericBinOp when it fails.
+    """
+
+    # Specialized subclasses add no slots, so a node can change its class in place
+    __slots__ = ("op", "right", "left", "method", "operate", "result_type", "receiver", "function", "offset")
 
     def __init__(self, op, right, left):
         self.op = op
@@ -352,26 +1471,174 @@ class BinOp(SpecialExpression):
         self.left = left
 
     def visit(self):
-        return eval(f"self.right.{BINOP_TO_FUNC_MAP[self.op]}(self.left)")
+        if self.op == ".":
+            return self.as_getattr().visit()
+        left, right = self.right.visit(), self.left.visit()
+        self.method = BINOP_TO_FUNC_MAP[self.op]
+        if type(left) is Number and type(right) is Number and self.op in NUMBER_BINOPS:
+            self.operate, self.result_type = NUMBER_BINOPS[self.op]
+            self.__class__ = NumberBinOp
+        else:
+            self.receiver = type(left)
+            self.function = getattr(self.receiver, self.method)
+            self.__class__ = MonomorphicBinOp
+        return getattr(left, self.method)(right)
+
+    def as_getattr(self):
+        """Turn a `.` node into a GetattrBinOp with an empty cache."""
+        self.__class__ = GetattrBinOp
+        self.receiver = None
+        return self
+
+    def deoptimize(self, left, right):
+        """Give up on specialization and evaluate generically from now on."""
+        self.__class__ = GenericBinOp
+        return getattr(left, self.method)(right)
 
     def repr(self):
         return self.visit().repr()
 
 
+class NumberBinOp(BinOp):
+    """Binary operation that has only seen two Numbers."""
+
+    __slots__ = ()
+
+    def visit(self):
+        left, right = self.right.visit(), self.left.visit()
+        if type(left) is Number and type(right) is Number:
+            return self.result_type(self.operate(left.value, right.value))
+        return self.deoptimize(left, right)
+
+
+class MonomorphicBinOp(BinOp):
+    """Binary operation that has only seen one type of left operand."""
+
+    __slots__ = ()
+
+    def visit(self):
+        left, right = self.right.visit(), self.left.visit()
+        if type(left) is self.receiver:
+            return self.function(left, right)
+        return self.deoptimize(left, right)
+
+
+class GenericBinOp(BinOp):
+    """Binary operation that has seen several types of left operand."""
+
+    __slots__ = ()
+
+    def visit(self):
+        return getattr(self.right.visit(), self.method)(self.left.visit())
+
+
+class GetattrBinOp(BinOp):
+    """Attribute access (`.`) operation.
+
+    Remembers the field position for the struct it last read a record of, so reading
+    the same field of records of that struct again is a single index.
+    """
+
+    __slots__ = ()
+
+    def visit(self):
+        return self.load(self.right.visit())
+
+    def load(self, value):
+        """The attribute of `value` this node reads; the VM and Python engine call this too."""
+        if type(value) is Record:
+            if value.shape is not self.receiver:
+                self.receiver, self.offset = value.shape, value.shape.offset(self.left)
+            return value.value[self.offset]
+        return value.getattr(self.left)
+
+
 class UnOp(SpecialExpression):
-    """Unary operation class for MochaScript."""
+    """Unary operation class for MochaScript.
+
+    Specializes itself on the operand type like BinOp.
+    """
+
+    __slots__ = ("op", "value", "method", "operate", "receiver", "function")
 
     def __init__(self, op, value):
         self.op = op
         self.value = value
 
     def visit(self):
-        return eval(f"self.value.{UNOP_TO_FUNC_MAP[self.op]}()")
+        value = self.value.visit()
+        self.method = UNOP_TO_FUNC_MAP[self.op]
+        if type(value) is Number:
+            self.operate = NUMBER_UNOPS[self.op]
+            self.__class__ = NumberUnOp
+        else:
+            self.receiver = type(value)
+            self.function = getattr(self.receiver, self.method)
+            self.__class__ = MonomorphicUnOp
+        return getattr(value, self.method)()
+
+    def deoptimize(self, value):
+        """Give up on specialization and evaluate generically from now on."""
+        self.__class__ = GenericUnOp
+        return getattr(value, self.method)()
+
+
+class NumberUnOp(UnOp):
+    """Unary operation that has only seen Numbers."""
+
+    __slots__ = ()
+
+    def visit(self):
+        value = self.value.visit()
+        if type(value) is Number:
+            return Number(self.operate(value.value))
+        return self.deoptimize(value)
+
+
+class MonomorphicUnOp(UnOp):
+    """Unary operation that has only seen one type of operand."""
+
+    __slots__ = ()
+
+    def visit(self):
+        value = self.value.visit()
+        if type(value) is self.receiver:
+            return self.function(value)
+        return self.deoptimize(value)
+
+
+class GenericUnOp(UnOp):
+    """Unary operation that has seen several types of operand."""
+
+    __slots__ = ()
+
+    def visit(self):
+        return getattr(self.value.visit(), self.method)()
+
+
+class LogicalNode(SpecialExpression):
+    """Short-circuiting `&&` and `||` operation."""
+
+    __slots__ = ("op", "right", "left")
+
+    def __init__(self, op, right, left):
+        self.op = op
+        self.right = right
+        self.left = left
+
+    def visit(self):
+        result = bool(self.right.visit().value)
+        # `&&` stops at the first false operand, `||` at the first true one
+        if result == (self.op == "||"):
+            return Boolean(result)
+        return Boolean(self.left.visit().value)
 
 
 class IfNode(SpecialExpression):
     """If-expression class for MochaScript."""
 
+    __slots__ = ("condition", "true_block", "false_block")
+
     def __init__(self, condition, true_block, false_block):
         self.condition = condition
         self.true_block = true_block
@@ -384,6 +1651,8 @@ class IfNode(SpecialExpression):
 class WhileNode(SpecialExpression):
     """While loop class for MochaScript."""
 
+    __slots__ = ("condition", "block")
+
     def __init__(self, condition, block):
         self.condition = condition
         self.block = block
@@ -399,72 +1668,161 @@ class WhileNode(SpecialExpression):
 class ForNode(SpecialExpression):
     """For-loop class for MochaScript."""
 
+    __slots__ = ("iterator", "var", "body", "slot", "cell")
+
     def __init__(self, iterator, var, body):
         self.iterator = iterator
         self.var = var
         self.body = body
+        self.slot = self.cell = None
 
     def visit(self):
-        # Reduce the iterator to a single atom
-        self.iterator = self.iterator.visit()
+        iterator = self.iterator.visit()
 
         # Ensure that the iterator is an actual iterator
-        if not isinstance(self.iterator, Array):
+        if not isinstance(iterator, ITERABLES):
             abort("For-loop can only accept an iterator")
 
-        # Get the start and end of the array
-        self.start, self.end = 0, len(self.iterator.value)
-
-        # Set result and initialize new environment
         result = None
-        ENV.append(MSEnv(**ENV[-1]))
-        ENV[-1][self.var] = Boolean(False)
-
-        # Iterate over the array
-        while self.start != self.end:
-            ENV[-1][self.var] = self.iterator.value[self.start]
+        store(self, self.var, Boolean(False))
+        for item in iterator:
+            store(self, self.var, item)
             result = self.body.visit()
-            self.start += 1
+        return result
+
+
+class LoopInvariantNode(SpecialExpression):
+    """Loop-invariant expression that is evaluated once per loop execution.
+
+    Maps and Sets can change in place, so an expression that reads one is evaluated every time.
+    """
+
+    __slots__ = ("expr", "cached", "references")
+
+    def __init__(self, expr):
+        self.expr = expr
+        self.cached = None
+        self.references = []
+        pending = [expr]
+        while pending:
+            node = pending.pop()
+            if isinstance(node, ReferenceNode):
+                self.references.append(node)
+            pending.extend(children(node))
+
+    def visit(self):
+        if self.cached is None:
+            value = self.expr.visit()
+            if any(isinstance(reference.visit(), (Map, Set)) for reference in self.references):
+                return value
+            self.cached = value
+        return self.cached
+
 
+class HoistedLoopNode(SpecialExpression):
+    """Loop whose invariant expressions have been hoisted out of its body."""
+
+    __slots__ = ("loop", "invariants")
+
+    def __init__(self, loop, invariants):
+        self.loop = loop
+        self.invariants = invariants
+
+    def visit(self):
+        # Save the outer values in case the loop is re-entered through a recursive call
+        saved = [invariant.cached for invariant in self.invariants]
+        for invariant in self.invariants:
+            invariant.cached = None
+        result = self.loop.visit()
+        for invariant, cached in zip(self.invariants, saved):
+            invariant.cached = cached
         return result
 
 
 class RangeNode(SpecialExpression):
     """Range class for MochaScript."""
 
+    __slots__ = ("start", "end")
+
     def __init__(self, start, end):
         self.start = start
         self.end = end
 
     def visit(self):
-        return Array([Number(n) for n in range(int(self.start.visit().value), int(self.end.visit().value + 1))])
+        return Range(int(self.start.visit().value), int(self.end.visit().value))
+
+
+class ArrayNode(SpecialExpression):
+    """Array literal with elements that are only known when it runs.
+
+    Literals of constants are made into Arrays by the parser instead.
+    """
+
+    __slots__ = ("elements",)
+
+    def __init__(self, elements):
+        self.elements = elements
+
+    def visit(self):
+        return Array(self.elements)
+
+
+class SetNode(SpecialExpression):
+    """Set literal; each evaluation makes a new set, since sets can be changed."""
+
+    __slots__ = ("elements",)
+
+    def __init__(self, elements):
+        self.elements = elements
+
+    def visit(self):
+        return Set(element.visit() for element in self.elements)
+
+
+class MapNode(SpecialExpression):
+    """Map literal; each evaluation makes a new map, since maps can be changed."""
+
+    __slots__ = ("keys", "values")
+
+    def __init__(self, keys, values):
+        self.keys = keys
+        self.values = values
+
+    def visit(self):
+        return Map(zip([key.visit() for key in self.keys], [value.visit() for value in self.values]))
 
 
 class SayNode(SpecialExpression):
     """It says the expression."""
 
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
 
     def visit(self):
         result = self.expr.visit()
-        print(result.str())
+        say(result.str())
         return result
 
 
 class AskNode(SpecialExpression):
     """Get user input."""
 
+    __slots__ = ("expr",)
+
     def __init__(self, expr):
         self.expr = expr
 
     def visit(self):
-        return String(input(self.expr.visit().str()))
+        return String(ask(self.expr.visit().str()))
 
 
 class ExitNode(SpecialExpression):
     """It says the expression, and then exits."""
 
+    __slots__ = ("expr",)
+
     def __init__(self, expr=String()):
         self.expr = expr
 
@@ -475,71 +1833,327 @@ class ExitNode(SpecialExpression):
 class BlockNode(SpecialExpression):
     """Multiple lines of code."""
 
+    __slots__ = ("exprs",)
+
     def __init__(self, *exprs):
-        self.exprs = exprs
+        self.exprs = list(exprs)
 
     def visit(self):
-        return [expr.visit() for expr in self.exprs][-1]
+        result = None
+        for expr in self.exprs:
+            result = expr.visit()
+        return result
+
+    def flatten(self):
+        """List the expressions of this block and its nested blocks, in order."""
+        exprs, pending = [], list(reversed(self.exprs))
+        while pending:
+            expr = pending.pop()
+            if isinstance(expr, BlockNode):
+                pending.extend(reversed(expr.exprs))
+            else:
+                exprs.append(expr)
+        return exprs
 
 
 class CallFunctionNode(SpecialExpression):
     """Calls a function."""
 
+    __slots__ = ("function", "arguments", "tail")
+
     def __init__(self, function, arguments):
         self.function = function
         self.arguments = arguments
+        # Whether the result of the call is the result of the function containing it; set by the resolver
+        self.tail = False
 
     def visit(self):
-        self.function = self.function.visit()
-        if hasattr(self.function, "call"):
-            self.arguments = {
-                key: val.visit() for key, val in dict(zip(self.function.parameters, self.arguments)).items()
-            }
-            result = self.function.call(self.arguments)
-        else:
-            abort(f"{self.function.repr()} is not a callable object!")
-        return result
+        function = self.function.visit()
+        if not hasattr(function, "call"):
+            abort(f"{function.repr()} is not a callable object!")
+        arguments = {key: val.visit() for key, val in zip(function.parameters, self.arguments)}
+        if self.tail and isinstance(function, Function):
+            return TailCall(function, arguments)
+        return function.call(arguments)
 
 
 class AssignmentNode(SpecialExpression):
     """Assignment manager for MochaScript."""
 
+    __slots__ = ("name", "value", "slot", "cell")
+
     def __init__(self, name, value):
         self.name = name
         self.value = value
+        # Set by the resolver for assignments inside functions
+        self.slot = self.cell = None
 
     def visit(self):
-        ENV[-1][self.name] = self.value.visit()
-        return ENV[-1][self.name]
+        return store(self, self.name, self.value.visit())
 
 
 class InPlaceAssignmentNode(SpecialExpression):
     """In-place assignment manager for MochaScript."""
 
+    __slots__ = ("op", "name", "value", "slot", "cell", "operation")
+
     def __init__(self, op, name, value):
         self.op = op
         self.name = name
         self.value = value
+        self.slot = self.cell = None
+        # Built once so the operation keeps its specialization between evaluations
+        self.operation = BinOp(op, ReferenceNode(name), value)
 
     def visit(self):
-        return AssignmentNode(self.name, BinOp(self.op, ReferenceNode(self.name), self.value)).visit()
+        return store(self, self.name, self.operation.visit())
 
 
 class ReferenceNode(SpecialExpression):
     """Reference manager for MochaScript."""
 
+    __slots__ = ("name", "places")
+
     def __init__(self, name):
         self.name = name
+        # Set by the resolver for variables of functions: where to read the variable, in order
+        self.places = ()
 
     def visit(self):
-        value = ENV[-1].get(self.name)
-        if not value:
-            abort(f"Undefined variable '{self.name}'")
-        return value
+        frame = FRAMES[-1]
+        for kind, index in self.places:
+            if kind == LOCAL:
+                value = frame.slots[index]
+            elif kind == CELL:
+                value = frame.slots[index].value
+            else:
+                value = frame.closure[index].value
+            # Unset until assigned, so read the variable from further out meanwhile
+            if value is not None:
+                return value
+        return load_global(self.name)
+
+
+# Functions every program starts with, as global variables
+def slice_of(values, start, end):
+    """`values` from index `start` up to `end`, or to its end if there is no `end`."""
+    if not isinstance(values, Array) or not isinstance(start, Number) or not isinstance(end, (Number, type(None))):
+        abort("slice() needs an array or string and one or two numbers")
+    return values.slice(int(start.value), None if end is None else int(end.value))
+
+
+BUILTINS = {
+    "append": Builtin("append", ["path", "values"], append_file),
+    "chunks": Builtin("chunks", ["path", "size"], Stream.chunks),
+    "json_dump": Builtin("json_dump", ["value"], json_dump),
+    "json_lines": Builtin("json_lines", ["path"], JsonStream.lines),
+    "json_load": Builtin("json_load", ["text"], json_load),
+    "lines": Builtin("lines", ["path"], Stream.lines),
+    "map": Builtin("map", ["keys", "values"], Map.of),
+    "set": Builtin("set", ["values"], Set.of),
+    "slice": Builtin("slice", ["values", "start", "end"], slice_of),
+    "vec": Builtin("vec", ["values"], Vector.of),
+    "write": Builtin("write", ["path", "values"], write_file),
+}
 
 
 class MSEnv(dict):
-    pass
+    def __init__(self):
+        super().__init__(BUILTINS)
 
 
+# Global variables. Variables of functions live in frames instead.
 ENV = [MSEnv()]
+
+
+# Kinds of variable places: a slot of the current call, a shared cell in such a slot,
+# or a cell in the closure of the called function
+LOCAL, CELL, FREE = range(3)
+
+
+class Cell:
+    """A variable shared between a call and the functions created in it."""
+
+    __slots__ = ("value",)
+
+    def __init__(self, value=None):
+        self.value = value
+
+
+class Scope:
+    """Variables of a function, each with a fixed slot in the frames of its calls."""
+
+    def __init__(self, names, enclosing=None):
+        self.names = names
+        self.index = {name: slot for slot, name in enumerate(names)}
+        self.enclosing = enclosing
+        # Local variables that nested functions use, which live in cells
+        self.cells = set()
+        self.cell_slots = []
+        # (scope, name) of the enclosing functions' variables this function uses, and where
+        # each one is found in the enclosing call: (LOCAL, slot) or (FREE, closure index)
+        self.free = []
+        self.captures = []
+
+    def capture(self, owner, name):
+        """Closure index of the variable `name` of the enclosing function with scope `owner`."""
+        if (owner, name) not in self.free:
+            self.free.append((owner, name))
+            if self.enclosing is owner:
+                owner.cells.add(name)
+                self.captures.append((LOCAL, owner.index[name]))
+            else:
+                self.captures.append((FREE, self.enclosing.capture(owner, name)))
+        return self.free.index((owner, name))
+
+    def places(self, name):
+        """Where a use of `name` in this function reads it, in the order to try."""
+        places = []
+        if name in self.index:
+            places.append((CELL if name in self.cells else LOCAL, self.index[name]))
+        scope = self.enclosing
+        while scope is not None:
+            if name in scope.index:
+                places.append((FREE, self.capture(scope, name)))
+            scope = scope.enclosing
+        return tuple(places)
+
+
+class Frame:
+    """Variables of one function call."""
+
+    __slots__ = ("scope", "closure", "slots")
+
+    def __init__(self, scope, closure, arguments=()):
+        self.scope = scope
+        self.closure = closure
+        self.slots = list(arguments) + [None] * (len(scope.names) - len(arguments))
+        for slot in scope.cell_slots:
+            self.slots[slot] = Cell(self.slots[slot])
+
+
+# Frames of the running calls; None at the top level
+FRAMES = [None]
+
+
+def capture(frame, scope):
+    """Cells of `frame`'s variables that a function with `scope` created in that call uses."""
+    return tuple(frame.slots[index] if kind == LOCAL else frame.closure[index] for kind, index in scope.captures)
+
+
+def load_global(name):
+    value = ENV[-1].get(name)
+    if value is None:
+        abort(f"Undefined variable '{name}'")
+    return value
+
+
+def store(node, name, value):
+    """Assign a global, or the variable of the current call that the resolver gave `node`."""
+    if node.slot is None:
+        ENV[-1][name] = value
+    elif node.cell:
+        FRAMES[-1].slots[node.slot].value = value
+    else:
+        FRAMES[-1].slots[node.slot] = value
+    return value
+
+
+CHILD_FIELDS = {
+    BinOp: ("right", "left"),
+    LogicalNode: ("right", "left"),
+    UnOp: ("value",),
+    IfNode: ("condition", "true_block", "false_block"),
+    WhileNode: ("condition", "block"),
+    ForNode: ("iterator", "body"),
+    RangeNode: ("start", "end"),
+    ArrayNode: ("elements",),
+    SetNode: ("elements",),
+    MapNode: ("keys", "values"),
+    SayNode: ("expr",),
+    AskNode: ("expr",),
+    ExitNode: ("expr",),
+    BlockNode: ("exprs",),
+    CallFunctionNode: ("function", "arguments"),
+    AssignmentNode: ("value",),
+    InPlaceAssignmentNode: ("value",),
+    Function: ("body",),
+    LoopInvariantNode: ("expr",),
+    HoistedLoopNode: ("loop",),
+}
+
+
+def child_fields(node):
+    """Names of the attributes of `node` that hold sub-expressions."""
+    for cls in type(node).__mro__:
+        if cls in CHILD_FIELDS:
+            return CHILD_FIELDS[cls]
+    return ()
+
+
+def children(node):
+    """Sub-expressions of `node`."""
+    for field in child_fields(node):
+        value = getattr(node, field)
+        yield from value if isinstance(value, (list, tuple)) else [value]
+
+
+def assigned_names(node):
+    """Names assigned anywhere inside `node`, not counting nested function bodies."""
+    names, pending = set(), [node]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, (AssignmentNode, InPlaceAssignmentNode)):
+            names.add(node.name)
+        elif isinstance(node, ForNode):
+            names.add(node.var)
+        if not isinstance(node, Function):
+            pending.extend(children(node))
+    return names
+
+
+def mark_tail_calls(body):
+    """Mark the calls whose result is the result of the function with this body."""
+    pending = [body]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, BlockNode) and node.exprs:
+            pending.append(node.exprs[-1])
+        elif isinstance(node, IfNode):
+            pending += [node.true_block, node.false_block]
+        elif isinstance(node, CallFunctionNode):
+            node.tail = True
+
+
+def resolve(function, enclosing=None):
+    """Give the variables of `function` slots, and the variable uses in its body places.
+
+    Parameters and every name assigned in the body are local to the function. Other names
+    belong to the enclosing functions that have them, or are globals. Variables that nested
+    functions use are shared through cells, so a closure keeps only those alive.
+    """
+    parameters = list(function.parameters)
+    scope = Scope(parameters + sorted(assigned_names(function.body) - set(parameters)), enclosing)
+    function.scope = scope
+    mark_tail_calls(function.body)
+    references, stores, pending = [], [], [function.body]
+    while pending:
+        node = pending.pop()
+        if isinstance(node, Function):
+            resolve(node, scope)
+            continue
+        if isinstance(node, ReferenceNode):
+            references.append(node)
+        elif isinstance(node, (AssignmentNode, InPlaceAssignmentNode, ForNode)):
+            stores.append(node)
+            if isinstance(node, InPlaceAssignmentNode):
+                references.append(node.operation.right)
+        pending.extend(child for child in children(node) if isinstance(child, BaseObject))
+
+    # Nested functions have all been resolved, so it is known which variables need cells
+    for node in references:
+        node.places = scope.places(node.name)
+    for node in stores:
+        name = node.var if isinstance(node, ForNode) else node.name
+        node.slot, node.cell = scope.index[name], name in scope.cells
+    scope.cell_slots = sorted(scope.index[name] for name in scope.cells)
@@ -0,0 +1,186 @@
+from collections import Counter
+
+from obj_model import *
+
+# Largest range or string that constant folding will turn into a literal
+FOLD_SIZE_LIMIT = 256
+# Largest integer power, in bits, that constant folding will compute
+FOLD_BITS_LIMIT = 4096
+
+# Operations that cannot abort for the given literal operand types
+ALWAYS_FOLDABLE = {"==", "!=", "&&", "||"}
+FOLDABLE_BINOPS = {
+    (Number, Number): set(NUMBER_BINOPS),
+    (String, String): {"+", "-", "%", "<", ">", "<=", ">="},
+    (String, Number): {"+", "-", "*", "/", "%"},
+    (String, Boolean): {"+", "-", "%"},
+}
+FOLDABLE_UNOPS = (Number, String)
+
+# Operations that read the contents of their receiver, which may be a Map or Set that the loop changes in place
+LOOKUP_BINOPS = {".", "/", "in"}
+
+
+def map_children(node, function):
+    """Replace every sub-expression of `node` with `function(child)`."""
+    for field in child_fields(node):
+        value = getattr(node, field)
+        if isinstance(value, (list, tuple)):
+            setattr(node, field, type(value)(function(child) for child in value))
+        elif isinstance(value, BaseObject):
+            setattr(node, field, function(value))
+    if isinstance(node, InPlaceAssignmentNode):
+        node.operation = BinOp(node.op, ReferenceNode(node.name), node.value)
+    return node
+
+
+def too_large_to_fold(op, right, left):
+    """Whether `right op left` would make a huge number or string, estimated without computing it."""
+    if op == "**" and type(right) is Number and type(left) is Number:
+        base, exponent = right.value, left.value
+        return type(base) is int and type(exponent) is int and exponent * base.bit_length() > FOLD_BITS_LIMIT
+    if op == "*" and type(right) is String and type(left) is Number:
+        return len(right.value) * abs(left.value) > FOLD_SIZE_LIMIT
+    return False
+
+
+def is_literal(node):
+    return type(node) in (Number, String, Boolean)
+
+
+class Optimizer:
+    """Rewrites a MochaScript syntax tree into an equivalent but cheaper one."""
+
+    LEVELS = {
+        0: (),
+        1: ("fold_constants", "prune_branches", "short_circuit"),
+        2: ("fold_constants", "prune_branches", "short_circuit", "hoist_invariants"),
+    }
+
+    def __init__(self, level=1):
+        self.passes = [getattr(self, name) for name in self.LEVELS[level]]
+        self.stats = Counter()
+
+    def optimize(self, node):
+        """Run the passes for this optimization level over a syntax tree."""
+        return self.transform(node) if self.passes else node
+
+    def transform(self, node):
+        """Optimize the children of `node`, then `node` itself."""
+        if isinstance(node, BlockNode):
+            node = BlockNode(*node.flatten())
+        node = map_children(node, self.transform)
+        for rewrite in self.passes:
+            node = rewrite(node)
+        return node
+
+    def fold_constants(self, node):
+        """Evaluate operations whose operands are all literals."""
+        try:
+            if isinstance(node, BinOp) and is_literal(node.right) and is_literal(node.left):
+                foldable = FOLDABLE_BINOPS.get((type(node.right), type(node.left)), set()) | ALWAYS_FOLDABLE
+                if node.op not in foldable or too_large_to_fold(node.op, node.right, node.left):
+                    return node
+                result = getattr(node.right, BINOP_TO_FUNC_MAP[node.op])(node.left)
+            elif isinstance(node, UnOp) and type(node.value) in FOLDABLE_UNOPS:
+                result = getattr(node.value, UNOP_TO_FUNC_MAP[node.op])()
+            elif isinstance(node, RangeNode) and type(node.start) is Number and type(node.end) is Number:
+                if node.end.value - node.start.value >= FOLD_SIZE_LIMIT:
+                    return node
+                result = node.visit()
+            else:
+                return node
+        except (ArithmeticError, IndexError, TypeError, ValueError):
+            # Leave the error to be reported when the program runs
+            return node
+        if isinstance(result, String) and len(result.value) > FOLD_SIZE_LIMIT:
+            return node
+        self.stats["fold_constants"] += 1
+        return result
+
+    def prune_branches(self, node):
+        """Drop if-branches that can never run and literals whose value is unused."""
+        if isinstance(node, IfNode) and isinstance(node.condition, Atom):
+            self.stats["prune_branches"] += 1
+            return node.true_block if node.condition.value else node.false_block
+        if isinstance(node, BlockNode) and node.exprs:
+            exprs = [expr for expr in node.exprs[:-1] if not isinstance(expr, Atom)] + [node.exprs[-1]]
+            if len(exprs) < len(node.exprs):
+                self.stats["prune_branches"] += len(node.exprs) - len(exprs)
+                return BlockNode(*exprs) if len(exprs) > 1 else exprs[0]
+        return node
+
+    def short_circuit(self, node):
+        """Turn `&&` and `||` into operations that skip their right operand when possible."""
+        if isinstance(node, BinOp) and node.op in ("&&", "||"):
+            self.stats["short_circuit"] += 1
+            return LogicalNode(node.op, node.right, node.left)
+        return node
+
+    def hoist_invariants(self, node):
+        """Evaluate expressions that do not change inside a loop once per loop execution."""
+        if not isinstance(node, (WhileNode, ForNode)):
+            return node
+        assigned, invariants = assigned_names(node), []
+        hoist = lambda child: self.hoist(child, assigned, invariants)
+        if isinstance(node, WhileNode):
+            node.condition, node.block = hoist(node.condition), hoist(node.block)
+        else:
+            node.body = hoist(node.body)
+        if not invariants:
+            return node
+        self.stats["hoist_invariants"] += len(invariants)
+        return HoistedLoopNode(node, invariants)
+
+    def hoist(self, node, assigned, invariants):
+        """Wrap the largest loop-invariant operations inside `node`."""
+        if self.is_invariant(node, assigned):
+            if isinstance(node, (BinOp, LogicalNode, UnOp, RangeNode)):
+                invariant = LoopInvariantNode(node)
+                invariants.append(invariant)
+                return invariant
+            return node
+        if isinstance(node, (Function, LoopInvariantNode)):
+            return node
+        return map_children(node, lambda child: self.hoist(child, assigned, invariants))
+
+    def is_invariant(self, node, assigned):
+        """Whether `node` is free of side effects and only reads variables the loop never assigns."""
+        if isinstance(node, Atom):
+            return is_literal(node)
+        if isinstance(node, ReferenceNode):
+            return node.name not in assigned
+        if isinstance(node, BinOp) and node.op in LOOKUP_BINOPS:
+            # The receiver is the container: the left operand of `in`, the right one otherwise
+            receiver = node.left if node.op == "in" else node.right
+            if not is_literal(receiver):
+                return False
+        if isinstance(node, (BinOp, LogicalNode, UnOp, RangeNode)):
+            return all(
+                self.is_invariant(getattr(node, field), assigned)
+                for field in child_fields(node)
+                if isinstance(getattr(node, field), BaseObject)
+            )
+        return False
+
+
+def format_tree(node, depth=0):
+    """Indented, human-readable dump of a syntax tree."""
+    indent = "  " * depth
+    if isinstance(node, Atom) and not isinstance(node, Function):
+        return f"{indent}{type(node).__name__} {node.repr()}"
+    fields = child_fields(node)
+    details = " ".join(
+        f"{key}={value!r}"
+        for key, value in attributes(node).items()
+        if key not in fields and (isinstance(value, str) or isinstance(value, list) and key == "parameters")
+    )
+    lines = [f"{indent}{type(node).__name__} {details}".rstrip()]
+    for field in fields:
+        value = getattr(node, field)
+        for child in value if isinstance(value, (list, tuple)) else [value]:
+            if isinstance(child, BaseObject):
+                lines.append(format_tree(child, depth + 1))
+            else:
+                lines.append(f"{indent}  {child!r}")
+    return "\n".join(lines)
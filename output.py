@@ -0,0 +1,110 @@
+import atexit
+import queue
+import sys
+import threading
+
+# Characters said before a size-based flush
+BUFFER_SIZE = 64 * 1024
+# Seconds between time-based flushes
+FLUSH_INTERVAL = 0.1
+POLICIES = ("line", "size", "time")
+
+
+class Output:
+    """Collects what a program says and writes it to stdout in large chunks.
+
+    The flush policy decides when the chunk is written: after every line, once
+    `size` characters are waiting, or `interval` seconds after a line is said,
+    by a timer. With a background writer, the writes happen on another thread.
+    """
+
+    def __init__(self):
+        self.parts = []
+        self.pending = 0
+        self.writer = self.timer = None
+        # The timer flushes from its own thread
+        self.lock = threading.Lock()
+        self.configure()
+
+    def configure(self, size=BUFFER_SIZE, policy=None, interval=FLUSH_INTERVAL, background=False):
+        """Set the flush policy; by default lines go out at once on a terminal and in chunks otherwise."""
+        self.flush()
+        if policy is None:
+            policy = "line" if sys.stdout.isatty() else "size"
+        self.policy = policy
+        # The line policy flushes as soon as anything is waiting
+        self.limit = 0 if policy == "line" else size
+        self.interval = interval if policy == "time" else None
+        if background and self.writer is None:
+            self.writer = queue.Queue()
+            threading.Thread(target=self.write_chunks, daemon=True).start()
+        elif not background and self.writer is not None:
+            self.close()
+
+    def say(self, text):
+        """Print a line."""
+        with self.lock:
+            self.parts.append(text)
+            self.pending += len(text) + 1
+            if self.pending > self.limit:
+                self.write_parts()
+            elif self.interval is not None and self.timer is None:
+                # Written once the interval has passed, even if the program says nothing more until then
+                self.timer = threading.Timer(self.interval, self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def ask(self, prompt):
+        """Read a line from the user, after everything said so far is visible."""
+        self.flush(wait=True)
+        return input(prompt)
+
+    def flush(self, wait=False):
+        """Write everything said so far, and with `wait`, wait until the background writer is done too."""
+        with self.lock:
+            self.write_parts()
+        if wait and self.writer is not None:
+            self.writer.join()
+
+    def write_parts(self):
+        # Called with the lock held
+        if self.timer is not None:
+            self.timer.cancel()
+            self.timer = None
+        if self.parts:
+            chunk = "\n".join(self.parts) + "\n"
+            self.parts = []
+            self.pending = 0
+            if self.writer is None:
+                write(chunk)
+            else:
+                self.writer.put(chunk)
+
+    def close(self):
+        """Write everything said so far and stop the background writer."""
+        self.flush()
+        if self.writer is not None:
+            writer, self.writer = self.writer, None
+            writer.put(None)
+            writer.join()
+
+    def write_chunks(self):
+        writer = self.writer
+        while (chunk := writer.get()) is not None:
+            try:
+                write(chunk)
+            except OSError:
+                pass
+            writer.task_done()
+        writer.task_done()
+
+
+def write(chunk):
+    sys.stdout.write(chunk)
+    sys.stdout.flush()
+
+
+OUTPUT = Output()
+say = OUTPUT.say
+ask = OUTPUT.ask
+atexit.register(OUTPUT.close)
@@ -1,15 +1,60 @@
-import sly
-
 from lex import Lexer
 from obj_model import *
+from parsetab import CachedParser
 
 
-class Parser(sly.Parser):
+class Parser(CachedParser):
     tokens = Lexer.tokens
+    start = "script"
+
+    def __init__(self, on_statement=None):
+        # Called with each top-level statement as soon as it is parsed; the statements
+        # are then not kept, so arbitrarily long scripts run in constant memory.
+        self.on_statement = on_statement
+        self.errors = 0
+        self.program = None
+
+    def parse(self, tokens):
+        self.errors = 0
+        # Collected statements go here rather than into the parse result, which error recovery can throw away
+        self.program = BlockNode()
+        result = super().parse(tokens)
+        if self.on_statement is None:
+            return self.program if self.program.exprs else None
+        return result
+
+    def error(self, token):
+        self.errors += 1
+        return super().error(token)
+
+    @_("script expr LINE_TERM")
+    def script(self, p):
+        return self.statement(p.script, p.expr)
 
-    @_("expr LINE_TERM program")
+    @_("expr LINE_TERM")
+    def script(self, p):
+        return self.statement(BlockNode(), p.expr)
+
+    def statement(self, script, expr):
+        """Run or collect one top-level statement.
+
+        Nothing from the first syntax error on is kept, so every engine runs the same statements.
+        """
+        if self.errors:
+            return script
+        if self.on_statement is None:
+            self.program.exprs.append(expr)
+        else:
+            self.on_statement(expr)
+        return script
+
+    @_("program expr LINE_TERM")
     def program(self, p):
-        return BlockNode(p.expr, p.program)
+        # Left recursion keeps the parser stack flat however many statements a block has
+        if isinstance(p.program, BlockNode):
+            p.program.exprs.append(p.expr)
+            return p.program
+        return BlockNode(p.program, p.expr)
 
     @_("expr LINE_TERM")
     def program(self, p):
@@ -280,6 +325,16 @@ class Parser(sly.Parser):
         """Array"""
         return p.array
 
+    @_("STRUCT LPAREN func_params RPAREN")
+    def atom(self, p):
+        """Struct definition"""
+        return Struct(p.func_params if isinstance(p.func_params, tuple) else (p.func_params,))
+
+    @_("STRUCT IDENT LPAREN func_params RPAREN")
+    def atom(self, p):
+        """Struct definition"""
+        return Struct(p.func_params if isinstance(p.func_params, tuple) else (p.func_params,), name=p.IDENT)
+
     @_("FN LPAREN func_params RPAREN ARROW LPAREN expr RPAREN")
     def atom(self, p):
         """Function definition"""
@@ -338,13 +393,19 @@ class Parser(sly.Parser):
 
     @_("LBRACE key_val_pairs RBRACE")
     def atom(self, p):
-        """Object"""
-        return Object(p.key_val_pairs)
+        """Map"""
+        keys, values = zip(*p.key_val_pairs)
+        return MapNode(keys, values)
+
+    @_("LBRACE comma_sep RBRACE")
+    def atom(self, p):
+        """Set"""
+        return SetNode(p.comma_sep if isinstance(p.comma_sep, tuple) else (p.comma_sep,))
 
     @_("LBRACE RBRACE")
     def atom(self, p):
-        """Empty object"""
-        return Object()
+        """Empty map"""
+        return MapNode((), ())
 
     @_("FALSE")
     def atom(self, p):
@@ -380,9 +441,10 @@ class Parser(sly.Parser):
     @_("LBRACK comma_sep RBRACK")
     def array(self, p):
         """Array"""
-        if isinstance(p.comma_sep, Atom):
-            return Array([p.comma_sep])
-        return Array(p.comma_sep)
+        elements = p.comma_sep if isinstance(p.comma_sep, tuple) else (p.comma_sep,)
+        if all(isinstance(element, Atom) for element in elements):
+            return Array(elements)
+        return ArrayNode(list(elements))
 
     @_("LBRACK RBRACK")
     def array(self, p):
@@ -409,12 +471,12 @@ class Parser(sly.Parser):
 
     @_("key_val_pair COMMA key_val_pairs")
     def key_val_pairs(self, p):
-        return {**p.key_val_pair, **p.key_val_pairs}
+        return p.key_val_pair, *p.key_val_pairs
 
     @_("key_val_pair", "key_val_pair COMMA")
     def key_val_pairs(self, p):
-        return p.key_val_pair
+        return (p.key_val_pair,)
 
-    @_("STRING COLON expr")
+    @_("expr COLON expr")
     def key_val_pair(self, p):
-        return {p.STRING: p.expr}
+        return p.expr0, p.expr1
@@ -0,0 +1,97 @@
+import os
+import pickle
+import sys
+
+import sly
+from sly.yacc import YaccError
+
+import cache
+
+TABLES_VERSION = 2
+
+
+class ParseTables:
+    """The parts of a sly LRTable that the parser needs at run time."""
+
+    def __init__(self, lr_action, lr_goto, defaulted_states, shift_reduce=0, reduce_reduce=0):
+        self.lr_action = lr_action
+        self.lr_goto = lr_goto
+        self.defaulted_states = defaulted_states
+        # Conflict counts, reported again whenever the tables are loaded
+        self.shift_reduce = shift_reduce
+        self.reduce_reduce = reduce_reduce
+
+
+class CachedParser(sly.Parser):
+    """sly parser that stores its LALR tables on disk, keyed by a hash of the grammar.
+
+    Building the tables is by far the largest fixed cost of starting the interpreter.
+    The grammar objects themselves are cheap and are still built on every start.
+    Any change to the grammar changes the key, so the tables are rebuilt, and sly's
+    conflict warnings are shown, while the stale entry is removed. Loaded tables
+    repeat the warnings they were built with.
+    """
+
+    @classmethod
+    def _build(cls, definitions):
+        if "_build" in vars(cls):
+            return
+
+        directory = os.path.dirname(os.path.abspath(sys.modules[cls.__module__].__file__))
+        path = cache.cache_path(directory, cls.__qualname__, grammar_key(cls, definitions), "parsetab")
+        tables = load_tables(path)
+        if tables is None:
+            super()._build(definitions)
+            table = cls._lrtable
+            conflicts = (len(table.sr_conflicts), len(table.rr_conflicts))
+            cache.write(path, pickle.dumps((table.lr_action, table.lr_goto, table.defaulted_states, *conflicts)))
+            return
+
+        # Same steps as sly.Parser._build, minus the table construction
+        rules = cls._Parser__collect_rules(definitions)
+        if not cls._Parser__validate_specification():
+            raise YaccError("Invalid parser specification")
+        cls._Parser__build_grammar(rules)
+        report_conflicts(cls, tables)
+        cls._lrtable = tables
+
+
+def report_conflicts(cls, tables):
+    """Warn about the conflicts in stored tables, as sly does when it builds them."""
+    for count, kind, expected in (
+        (tables.shift_reduce, "shift/reduce", getattr(cls, "expected_shift_reduce", None)),
+        (tables.reduce_reduce, "reduce/reduce", getattr(cls, "expected_reduce_reduce", None)),
+    ):
+        if count and count != expected:
+            cls.log.warning("%d %s conflict%s", count, kind, "" if count == 1 else "s")
+
+
+def grammar_key(cls, definitions):
+    """Cache key covering everything the LALR tables are derived from."""
+    rules = [(name, chained_rules(value)) for name, value in definitions if callable(value) and hasattr(value, "rules")]
+    return cache.cache_key(
+        sly.__version__,
+        TABLES_VERSION,
+        sorted(cls.tokens),
+        getattr(cls, "precedence", ()),
+        getattr(cls, "start", None),
+        rules,
+    )
+
+
+def chained_rules(function):
+    """Rules of a rule function and of the earlier functions of the same name, which sly chains to it."""
+    rules = []
+    while function is not None:
+        rules.append(function.rules)
+        function = getattr(function, "next_func", None)
+    return rules
+
+
+def load_tables(path):
+    """ParseTables stored at `path`, or None if there are none."""
+    data = cache.read(path)
+    try:
+        return ParseTables(*pickle.loads(data)) if data else None
+    except (ValueError, TypeError, EOFError, pickle.UnpicklingError):
+        return None
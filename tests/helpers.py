@@ -0,0 +1,34 @@
+from compiler import Compiler
+from lex import Lexer
+from obj_model import ENV, MSEnv
+from parse import Parser
+from transpile import Transpiler
+from vm import VM
+
+lexer, parser = Lexer(), Parser()
+
+# How each engine runs a parsed program
+ENGINES = {
+    "tree": lambda ast: ast.visit(),
+    "vm": lambda ast: VM().run(Compiler().compile(ast)),
+    "py": lambda ast: Transpiler().transpile(ast).run(),
+}
+
+
+def parse(source):
+    """Syntax tree of MochaScript source code."""
+    return parser.parse(lexer.tokenize(source))
+
+
+def run_source(source):
+    """Run MochaScript source code with every engine, each in a fresh environment, and return the results by engine."""
+    results = {}
+    for engine, run in ENGINES.items():
+        ENV[:] = [MSEnv()]
+        results[engine] = run(parse(source))
+    return results
+
+
+def call(name, **arguments):
+    """Call the builtin `name` with keyword arguments."""
+    return ENV[-1][name].call(arguments)
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from obj_model import *
@@ -68,6 +69,130 @@ class ArrayTestCase(unittest.TestCase):
 
         self.assertEqual(abc.neg(), expected, "Array reversal failed")
 
+    def test_number_storage(self):
+        """Test that arrays of Numbers are stored in a machine array that fits them."""
+        self.assertEqual(Array([Number(1), Number(2)]).numbers.typecode, "q", "Integers not stored compactly")
+        self.assertEqual(Array([Number(1.5), Number(2.5)]).numbers.typecode, "d", "Floats not stored compactly")
+        self.assertNotIsInstance(Array([Number(1), Number(2.5)]), NumberArray, "Integers stored as floats")
+        self.assertNotIsInstance(Array([Number(1), Number(2**70)]), NumberArray, "Big integer lost precision")
+        self.assertNotIsInstance(Array([Number(1), String("a")]), NumberArray, "Mixed array stored compactly")
+
+    def test_number_storage_from_expressions(self):
+        """Test that arrays built from variables and expressions that give Numbers are stored compactly."""
+        ENV[:] = [MSEnv()]
+        ENV[-1].update(x=Number(1), y=Number(2))
+        numbers = ArrayNode([ReferenceNode("x"), BinOp("+", ReferenceNode("y"), Number(1))]).visit()
+
+        self.assertIsInstance(numbers, NumberArray, "Array of variables not stored compactly")
+        self.assertEqual(numbers, Array([Number(1), Number(3)]), "Array of variables has the wrong elements")
+
+    def test_number_array_operations(self):
+        """Test indexing, iteration, containment, reversal and repr() of a compact array."""
+        numbers = Array([Number(1.0), Number(2.5), Number(4.0)])
+
+        self.assertEqual(numbers.div(Number(-1)), Number(4.0), "Compact array indexing failed")
+        self.assertEqual(list(numbers), [Number(1.0), Number(2.5), Number(4.0)], "Compact array iteration failed")
+        self.assertEqual(numbers.contains(Number(2.5)), Boolean(True), "Compact array containment failed")
+        self.assertEqual(numbers.contains(String("4")), Boolean(False), "String found in compact array")
+        self.assertEqual(
+            numbers.neg(), Array([Number(4.0), Number(2.5), Number(1.0)]), "Compact array reversal failed"
+        )
+        self.assertEqual(numbers.repr(), "[1, 2.5, 4]", "Compact array repr() incorrect")
+        self.assertEqual(pickle.loads(pickle.dumps(numbers)), numbers, "Unpickled compact array changed")
+
+    def test_mixed_fallback(self):
+        """Test that adding other values to a compact array gives a generic one."""
+        numbers = Array([Number(1), Number(2)])
+
+        self.assertIsInstance(numbers.add(Number(3)), NumberArray, "Appending a Number lost compact storage")
+        widened = numbers.add(Number(0.5))
+        self.assertEqual(widened, Array([Number(1), Number(2), Number(0.5)]), "Appending a float failed")
+        self.assertNotIsInstance(widened, NumberArray, "Integers stored as floats")
+        mixed = numbers.add(Boolean(True))
+        self.assertNotIsInstance(mixed, NumberArray, "Mixed array stored compactly")
+        self.assertEqual(mixed, Array([Number(1), Number(2), Boolean(True)]), "Appending a Boolean failed")
+
+    def test_exact_mixed_numbers(self):
+        """Test that integers in an array with floats stay exact."""
+        three = Array([Number(3), Number(0.5)]).div(Number(0))
+        large = Array([Number(1.5)]).add(Number(2**53 + 1)).div(Number(1))
+
+        self.assertEqual(three.exp(Number(40)), Number(3**40), "Integer became a float")
+        self.assertEqual(large, Number(2**53 + 1), "Large integer rounded by a float array")
+
+    def test_concatenation(self):
+        """Test adding two Arrays."""
+        letters = Array([String("a")]).add(Array([String("b"), Number(1)]))
+
+        self.assertEqual(letters, Array([String("a"), String("b"), Number(1)]), "Array concatenation failed")
+
+    def test_hashing(self):
+        """Test that equal Arrays hash alike, however they store their elements."""
+        numbers = Array([Number(1), Number(2), Number(3)])
+
+        self.assertEqual(hash(numbers), hash(Range(1, 3)), "Range and Array hash differently")
+        self.assertEqual(hash(Array([String("a"), numbers])), hash(Array([String("a"), numbers])), "Hashes differ")
+        with self.assertRaises(TypeError):
+            hash(Array([Function(BlockNode(), [])]))
+
+    def test_shared_appending(self):
+        """Test that appending shares storage with the array appended to, without changing it."""
+        letters = Array([String("a")])
+        longer = letters.add(String("b"))
+        other = letters.add(String("c"))
+
+        self.assertIs(longer.items, letters.items, "Appending to the longest array copied it")
+        self.assertIsNot(other.items, letters.items, "Appending to a shorter array did not copy it")
+        self.assertEqual(letters, Array([String("a")]), "Appending changed the array")
+        self.assertEqual(longer, Array([String("a"), String("b")]), "Shared append failed")
+        self.assertEqual(other, Array([String("a"), String("c")]), "Copied append failed")
+        self.assertEqual(letters.div(Number(-1)), String("a"), "Indexing read past the length")
+        self.assertEqual(list(letters), [String("a")], "Iteration read past the length")
+
+    def test_shared_number_appending(self):
+        """Test that compact arrays share their buffer when appended to, and widen when they must."""
+        numbers = Array([Number(1), Number(2)])
+        longer = numbers.add(Number(3)).add(Array([Number(4)]))
+        widened = numbers.add(Number(0.5))
+
+        self.assertIs(longer.items, numbers.items, "Appending to the longest compact array copied it")
+        self.assertEqual(longer, Array([Number(1), Number(2), Number(3), Number(4)]), "Compact append failed")
+        self.assertEqual(widened, Array([Number(1), Number(2), Number(0.5)]), "Widening append failed")
+        self.assertEqual(numbers.numbers.tolist(), [1, 2], "Appending changed the compact array")
+
+    def test_slices(self):
+        """Test that slices and reversals share the items of the array they come from."""
+        letters = Array([String(letter) for letter in "abcdefgh"])
+        middle = letters.slice(1, -1)
+        backwards = middle.neg()
+
+        self.assertIs(middle.items, letters.items, "Slice copied the array")
+        self.assertIs(backwards.items, letters.items, "Reversal copied the array")
+        self.assertEqual(backwards, Array([String(letter) for letter in "gfedcb"]), "Reversed slice failed")
+        self.assertEqual(backwards.div(Number(-1)), String("b"), "Reversed indexing failed")
+        self.assertEqual(backwards.slice(1, 3).add(String("z")).repr(), '["f", "e", "z"]', "Appending to a view failed")
+        self.assertEqual(letters.slice(0, 1).items, [String("a")], "Small slice kept the whole array")
+
+    def test_pickling(self):
+        """Test that arrays and views of them survive the program cache, without the items they cannot see."""
+        letters = Array([String(letter) for letter in "abcdefgh"])
+        backwards = letters.slice(1, -1).neg()
+
+        self.assertEqual(pickle.loads(pickle.dumps(letters)), letters, "Unpickled array changed")
+        copy = pickle.loads(pickle.dumps(backwards))
+        self.assertEqual(copy, backwards, "Unpickled view changed")
+        self.assertEqual(len(copy.items), 6, "Unpickled view kept the whole array")
+
+    def test_number_slices(self):
+        """Test slicing and reversing compact arrays and ranges."""
+        numbers = Array([Number(n) for n in range(8)])
+
+        self.assertIsInstance(numbers.neg(), NumberArray, "Reversal lost compact storage")
+        self.assertEqual(numbers.neg().slice(0, 3).numbers.tolist(), [7, 6, 5], "Compact reversed slice failed")
+        self.assertEqual(Range(1, 10).slice(2, -2), Range(3, 8), "Range slicing failed")
+        tail = BUILTINS["slice"].call({"values": numbers, "start": Number(6)})
+        self.assertEqual(tail, Array([Number(6), Number(7)]), "slice() without an end failed")
+
 
 if __name__ == "__main__":
     unittest.main()
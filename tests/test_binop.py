@@ -0,0 +1,58 @@
+import unittest
+
+from obj_model import *
+
+
+class BinOpTestCase(unittest.TestCase):
+    """Test cases for self-specializing operation nodes."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_number_specialization(self):
+        """Test that a BinOp over two Numbers becomes a NumberBinOp."""
+        node = BinOp("+", Number(1), Number(2))
+
+        self.assertEqual(node.visit(), Number(3), "First evaluation failed")
+        self.assertIsInstance(node, NumberBinOp, "BinOp did not specialize on Numbers")
+        self.assertEqual(node.visit(), Number(3), "Specialized evaluation failed")
+
+    def test_comparison_specialization(self):
+        """Test that Number comparisons produce Booleans."""
+        node = BinOp("<=", Number(1), Number(2))
+
+        self.assertEqual(node.visit(), Boolean(True), "First comparison failed")
+        self.assertEqual(node.visit(), Boolean(True), "Specialized comparison failed")
+
+    def test_monomorphic_specialization(self):
+        """Test that a BinOp over Strings caches the String method."""
+        node = BinOp("*", String("ab"), Number(2))
+
+        self.assertEqual(node.visit(), String("abab"), "First evaluation failed")
+        self.assertIsInstance(node, MonomorphicBinOp, "BinOp did not specialize on String")
+        self.assertEqual(node.visit(), String("abab"), "Specialized evaluation failed")
+
+    def test_deoptimization(self):
+        """Test that a failed guard falls back to the generic path."""
+        ENV[-1]["x"] = Number(1)
+        node = BinOp("+", ReferenceNode("x"), Number(1))
+        node.visit()
+        ENV[-1]["x"] = String("a")
+
+        self.assertEqual(node.visit(), String("a1"), "Deoptimized evaluation failed")
+        self.assertIsInstance(node, GenericBinOp, "BinOp did not deoptimize")
+
+    def test_unary_specialization(self):
+        """Test that a UnOp specializes and deoptimizes."""
+        ENV[-1]["x"] = Number(2)
+        node = UnOp("-", ReferenceNode("x"))
+
+        self.assertEqual(node.visit(), Number(-2), "Number negation failed")
+        self.assertIsInstance(node, NumberUnOp, "UnOp did not specialize on Numbers")
+        ENV[-1]["x"] = String("AB")
+        self.assertEqual(node.visit(), String("ab"), "Deoptimized negation failed")
+        self.assertIsInstance(node, GenericUnOp, "UnOp did not deoptimize")
+
+
+if __name__ == "__main__":
+    unittest.main()
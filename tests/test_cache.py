@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+import cache
+from obj_model import *
+
+
+class ProgramCacheTestCase(unittest.TestCase):
+    """Test cases for the compiled-program (.mochac) cache."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+        self.directory = tempfile.TemporaryDirectory()
+        self.script = os.path.join(self.directory.name, "script.mocha")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Test that cached statements evaluate like the original ones."""
+        source = "x = 2; x * 3;"
+        statements = [AssignmentNode("x", Number(2)), BinOp("*", ReferenceNode("x"), Number(3))]
+        cache.store_program(self.script, source, statements)
+
+        results = [statement.visit() for statement in cache.load_program(self.script, source)]
+        self.assertEqual(results, [Number(2), Number(6)], "Cached statements failed")
+
+    def test_invalidation(self):
+        """Test that changed source or options miss the cache and entries for old source are removed."""
+        cache.store_program(self.script, "1;", [Number(1)], "O0")
+
+        self.assertIsNone(cache.load_program(self.script, "2;", "O0"), "Changed source should miss")
+        self.assertIsNone(cache.load_program(self.script, "1;", "O1"), "Changed options should miss")
+        cache.store_program(self.script, "1;", [Number(1)], "O1")
+        self.assertIsNotNone(cache.load_program(self.script, "1;", "O0"), "Other options' entry was removed")
+        cache.store_program(self.script, "2;", [Number(2)], "O0")
+        self.assertEqual(
+            len(os.listdir(os.path.join(self.directory.name, cache.CACHE_DIR))), 1, "Stale entries were kept"
+        )
+
+    def test_incomplete_program(self):
+        """Test that a program whose parse did not finish is not cached."""
+        writer = cache.ProgramWriter(cache.program_path(self.script, "1; 2;"))
+        writer.add(Number(1))
+        writer.close(commit=False)
+
+        self.assertIsNone(cache.load_program(self.script, "1; 2;"), "Incomplete program was cached")
+        self.assertEqual(os.listdir(os.path.join(self.directory.name, cache.CACHE_DIR)), [], "Temporary file was kept")
+
+    def test_corrupt_program(self):
+        """Test that an entry that cannot be read back is a cache miss rather than an error."""
+        cache.store_program(self.script, "1; 2;", [Number(1), Number(2)])
+        path = cache.program_path(self.script, "1; 2;")
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) // 2)
+
+        self.assertIsNone(cache.load_program(self.script, "1; 2;"), "Corrupt entry was not a miss")
+
+    def test_array_literal(self):
+        """Test that array literals with variables are cached as nodes and read the variables when they run."""
+        statement = ArrayNode([ReferenceNode("x"), Number(2)])
+        cache.store_program(self.script, "[x, 2];", [statement])
+        ENV[-1]["x"] = Number(5)
+
+        results = [statement.visit() for statement in cache.load_program(self.script, "[x, 2];")]
+        self.assertEqual(results, [Array([Number(5), Number(2)])], "Cached literal did not read its variable")
+
+    def test_clear(self):
+        """Test clearing the cache next to a script."""
+        cache.store_program(self.script, "1;", [Number(1)])
+        tables = cache.cache_path(self.directory.name, "Parser", "0123456789abcdef", "parsetab")
+        cache.write(tables, b"tables")
+        cache.clear(self.script)
+
+        self.assertIsNone(cache.load_program(self.script, "1;"), "Cache was not cleared")
+        self.assertEqual(cache.read(tables), b"tables", "Parse tables were removed")
+
+
+if __name__ == "__main__":
+    unittest.main()
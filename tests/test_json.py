@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+
+from helpers import call
+from obj_model import *
+
+
+class JsonTestCase(unittest.TestCase):
+    """Test cases for converting between JSON text and MochaScript values."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_load(self):
+        """Test decoding JSON into maps, arrays, strings, numbers and booleans."""
+        data = call("json_load", text=String('{"name": "mocha", "tags": [1, 2], "ok": true, "none": null}'))
+
+        self.assertIsInstance(data, Map, "Object not decoded as a Map")
+        self.assertEqual(data.div(String("name")), String("mocha"), "String decoded wrongly")
+        self.assertEqual(data.div(String("tags")), Array([Number(1), Number(2)]), "Array decoded wrongly")
+        self.assertIsInstance(data.div(String("tags")), NumberArray, "Numbers not stored compactly")
+        self.assertEqual(data.div(String("ok")), Boolean(True), "Boolean decoded wrongly")
+        self.assertEqual(data.div(String("none")), Boolean(False), "Null not decoded as false")
+
+    def test_dump(self):
+        """Test encoding values as JSON."""
+        point = Struct(["x", "y"], "point")
+        values = Array([Map([(String("a"), Number(1.0)), (Number(2), Boolean(False))]), Range(1, 2), String("é")])
+
+        self.assertEqual(
+            call("json_dump", value=values).value, '[{"a": 1, "2": false}, [1, 2], "é"]', "Encoding failed"
+        )
+        record = point.call({"x": Number(1), "y": Number(2.5)})
+        self.assertEqual(call("json_dump", value=record).value, '{"x": 1, "y": 2.5}', "Record encoding failed")
+
+    def test_round_trip(self):
+        """Test that decoding encoded values gives them back."""
+        text = String('{"list": [1, "two", [3.5, false]], "empty": {}}')
+
+        self.assertEqual(
+            call("json_load", text=call("json_dump", value=call("json_load", text=text))),
+            call("json_load", text=text),
+            "Round trip changed the value",
+        )
+
+    def test_lines(self):
+        """Test decoding a newline-delimited JSON file one line at a time, skipping blank lines."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "rows.ndjson")
+            with open(path, "w") as file:
+                file.write('{"n": 1}\n\n[2]\n')
+            rows = list(call("json_lines", path=String(path)))
+
+        self.assertEqual(rows, [Map([(String("n"), Number(1))]), Array([Number(2)])], "Lines decoded wrongly")
+
+    def test_errors(self):
+        """Test that invalid JSON and values without a JSON form abort."""
+        with self.assertRaises(SystemExit):
+            call("json_load", text=String("[1,"))
+        with self.assertRaises(SystemExit):
+            call("json_dump", value=Function(BlockNode(), []))
+        with self.assertRaises(SystemExit):
+            call("json_dump", value=Map([(Array([Number(1)]), Number(1))]))
+
+    def test_non_finite(self):
+        """Test that NaN and infinities, which JSON cannot hold, abort instead of writing invalid JSON."""
+        for number in (float("nan"), float("inf"), -float("inf")):
+            for value in (Number(number), Array([Number(1.5), Number(number)]), Map([(String("x"), Number(number))])):
+                with self.assertRaises(SystemExit, msg=f"{value.repr()} was encoded"):
+                    call("json_dump", value=value)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,70 @@
+import pickle
+import unittest
+
+from helpers import run_source
+from obj_model import *
+
+
+class MapTestCase(unittest.TestCase):
+    """Test cases for MochaScript's Map object."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_lookup(self):
+        """Test looking keys up, with keys normalized to equal values."""
+        table = Map([(String("a"), Number(1)), (Number(2), String("two")), (Array([Number(1)]), Boolean(True))])
+
+        self.assertEqual(table.div(String("a")), Number(1), "String key lookup failed")
+        self.assertEqual(table.div(Number(2.0)), String("two"), "Equal float key lookup failed")
+        self.assertEqual(table.div(Range(1, 1)), Boolean(True), "Equal Range key lookup failed")
+        self.assertEqual(table.getattr("a"), Number(1), "Attribute lookup failed")
+        self.assertEqual(table.contains(String("b")), Boolean(False), "Missing key found")
+        self.assertEqual(table.contains(Map()), Boolean(False), "Unhashable key found")
+        with self.assertRaises(SystemExit):
+            table.div(String("b"))
+
+    def test_operations(self):
+        """Test merging, removing keys and setting and deleting them in place."""
+        table = Map([(String("a"), Number(1))])
+
+        merged = table.add(Map([(String("b"), Number(2))]))
+        self.assertEqual(merged.getattr("keys"), Array([String("a"), String("b")]), "Merging failed")
+        self.assertEqual(merged.sub(String("a")), Map([(String("b"), Number(2))]), "Removing a key failed")
+        self.assertEqual(table.getattr("length"), Number(1), "Operation changed the map")
+
+        table.getattr("set").call({"key": Number(3), "value": Number(4)})
+        table.getattr("delete").call({"key": String("a")})
+        self.assertEqual(table, Map([(Number(3), Number(4))]), "Setting or deleting in place failed")
+        default = table.getattr("get").call({"key": Number(9), "default": Number(0)})
+        self.assertEqual(default, Number(0), "Default for a missing key failed")
+        with self.assertRaises(SystemExit):
+            table.getattr("set").call({"key": Set(), "value": Number(1)})
+
+    def test_literal(self):
+        """Test that a map literal makes a new map on every evaluation, with every engine."""
+        source = 'f = fn f(x) -> ({x: 1, "a": x}); m = f(2); (m.set(3, 3)); t = f(2);'
+        source += "n = 0; for k in t (n += 1); t / n;"
+
+        for engine, result in run_source(source).items():
+            with self.subTest(engine=engine):
+                self.assertEqual(result, Number(1), "Map literal failed")
+
+    def test_map_builtin(self):
+        """Test making maps from parallel arrays of keys and values."""
+        make = ENV[-1]["map"]
+        table = make.call({"keys": Array([String("x"), String("y")]), "values": Range(1, 2)})
+
+        self.assertEqual(table.repr(), '{"x": 1, "y": 2}', "Map repr() incorrect")
+        with self.assertRaises(SystemExit):
+            make.call({"keys": Array([String("x")]), "values": Array()})
+
+    def test_pickling(self):
+        """Test that Maps can be pickled."""
+        table = Map([(String("a"), Array([Number(1)]))])
+
+        self.assertEqual(pickle.loads(pickle.dumps(table)), table, "Unpickled Map changed")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,5 @@
+import copy
+import pickle
 import unittest
 
 from obj_model import *
@@ -62,6 +64,51 @@ class NumberTestCase(unittest.TestCase):
 
         self.assertEqual(two.neg(), negative_two, "Negation failed")
 
+    def test_integers(self):
+        """Test that whole numbers stay exact ints and fractions are floats."""
+        self.assertIs(type(Number("42").value), int, "Whole number literal is not an int")
+        self.assertIs(type(Number("4.5").value), float, "Fractional literal is not a float")
+        self.assertIs(type(Number(6).div(Number(3)).value), int, "Exact division is not an int")
+        self.assertEqual(Number(7).div(Number(2)), Number(3.5), "Inexact division failed")
+        self.assertIs(type(Number(2).add(Number(0.5)).value), float, "Int and float did not give a float")
+
+    def test_big_integers(self):
+        """Test arithmetic on integers beyond the precision of floats."""
+        big = Number(2).exp(Number(53)).add(Number(1))
+
+        self.assertEqual(big.repr(), "9007199254740993", "Large integer lost precision")
+        self.assertEqual(Number(10).exp(Number(30)).div(Number(10).exp(Number(29))), Number(10), "Big division failed")
+        self.assertEqual(Number(2).exp(Number(100)).mod(Number(3)), Number(1), "Big modulus failed")
+
+    def test_repr(self):
+        """Test that whole floats print like integers."""
+        self.assertEqual(Number(2.5).mul(Number(2)).repr(), "5", "Whole float printed with a fraction")
+        self.assertEqual(Number(1e20).repr(), "100000000000000000000", "Large whole float printed wrongly")
+        self.assertEqual(Number(-0.0).repr(), "0", "Negative zero printed wrongly")
+
+    def test_small_numbers_shared(self):
+        """Test that small whole numbers are made once and larger or fractional ones each time."""
+        self.assertIs(Number(3).add(Number(4)), Number(7), "Small number not shared")
+        self.assertIs(Number(-1), Number("1").neg(), "Small negative number not shared")
+        self.assertIsNot(Number(0.5), Number(0.5), "Fractional number shared")
+        self.assertEqual(Number(100000), Number(100000), "Large numbers not equal")
+
+    def test_cached_number_pickling(self):
+        """Test that unpickled small numbers are the shared instances."""
+        self.assertIs(pickle.loads(pickle.dumps(Number(5))), Number(5), "Unpickled number not shared")
+        self.assertEqual(pickle.loads(pickle.dumps(Number(2.5))), Number(2.5), "Unpickled number changed")
+
+    def test_slots(self):
+        """Test that numbers and booleans have no attribute dictionary."""
+        self.assertFalse(hasattr(Number(2.5), "__dict__"), "Number has an attribute dictionary")
+        self.assertFalse(hasattr(Boolean(True), "__dict__"), "Boolean has an attribute dictionary")
+
+    def test_boolean_singletons(self):
+        """Test that comparisons return the two shared booleans."""
+        self.assertIs(Number(1).lt(Number(2)), Boolean(True), "True is not a singleton")
+        self.assertIs(Number(1).gt(Number(2)), FALSE, "False is not a singleton")
+        self.assertIs(copy.copy(TRUE), TRUE, "Copied boolean is a new object")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,109 @@
+import unittest
+
+from lex import Lexer
+from obj_model import *
+from optimize import Optimizer
+from parse import Parser
+
+
+class OptimizerTestCase(unittest.TestCase):
+    """Test cases for the syntax tree optimizer."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_constant_folding(self):
+        """Test folding of nested literal operations."""
+        tree = BinOp("*", BinOp("+", Number(1), Number(2)), UnOp("-", Number(4)))
+
+        self.assertEqual(Optimizer(1).optimize(tree), Number(-12), "Constant folding failed")
+
+    def test_unsafe_folding(self):
+        """Test that operations which would fail are left for run time."""
+        tree = BinOp("/", Number(1), Number(0))
+
+        self.assertIsInstance(Optimizer(1).optimize(tree), BinOp, "Division by zero was folded")
+
+    def test_large_folding(self):
+        """Test that powers and string repeats too large to compute quickly are left for run time."""
+        power = BinOp("**", Number(2), Number(99999999))
+        repeat = BinOp("*", String("a"), BinOp("**", Number(10), Number(9)))
+
+        self.assertIsInstance(Optimizer(1).optimize(power), BinOp, "Huge power was folded")
+        self.assertIsInstance(Optimizer(1).optimize(repeat), BinOp, "Huge string repeat was folded")
+        self.assertEqual(
+            Optimizer(1).optimize(BinOp("*", String("ab"), Number(3))), String("ababab"), "Small repeat not folded"
+        )
+
+    def test_range_folding(self):
+        """Test folding of small literal ranges."""
+        tree = RangeNode(Number(1), Number(3))
+
+        self.assertEqual(
+            Optimizer(1).optimize(tree), Array([Number(1), Number(2), Number(3)]), "Range folding failed"
+        )
+
+    def test_dead_branch(self):
+        """Test removal of an if-branch with a constant condition."""
+        tree = IfNode(BinOp(">", Number(2), Number(1)), String("yes"), ReferenceNode("undefined"))
+
+        self.assertEqual(Optimizer(1).optimize(tree), String("yes"), "Dead branch was not removed")
+
+    def test_short_circuit(self):
+        """Test that `&&` skips its right operand when the left one is false."""
+        ENV[-1]["x"] = Boolean(False)
+        tree = Optimizer(1).optimize(BinOp("&&", ReferenceNode("x"), ReferenceNode("undefined")))
+
+        self.assertEqual(tree.visit(), Boolean(False), "Short-circuit evaluation failed")
+
+    def test_loop_invariant_hoisting(self):
+        """Test that invariant expressions in a loop are wrapped and still give the same result."""
+        body = BlockNode(
+            InPlaceAssignmentNode("+", "total", BinOp("*", ReferenceNode("n"), Number(2))),
+            InPlaceAssignmentNode("+", "i", Number(1)),
+        )
+        loop = WhileNode(BinOp("<", ReferenceNode("i"), Number(5)), body)
+        ENV[-1].update(n=Number(3), i=Number(0), total=Number(0))
+        tree = Optimizer(2).optimize(loop)
+
+        self.assertIsInstance(tree, HoistedLoopNode, "Nothing was hoisted")
+        self.assertEqual(len(tree.invariants), 1, "Only `n * 2` is loop-invariant")
+        tree.visit()
+        self.assertEqual(ENV[-1]["total"], Number(30), "Hoisted loop gave a wrong result")
+
+    def test_changing_collections(self):
+        """Test that lookups in a Map or Set that the loop changes are not hoisted."""
+        source = (
+            "m = {}; s = set([]); sizes = 0; hits = 0;"
+            "(m.set(k, k * 2); s.add(k); sizes += (m.length); hits += ((1 if 2 in s else 0)); for k in 1 to 3);"
+        )
+        tree = Optimizer(2).optimize(Parser().parse(Lexer().tokenize(source)))
+        tree.visit()
+
+        self.assertEqual(ENV[-1]["sizes"], Number(6), "Map length was hoisted")
+        self.assertEqual(ENV[-1]["hits"], Number(2), "Set membership was hoisted")
+
+    def test_changing_operands(self):
+        """Test that a hoisted operation on a Map is evaluated again on every iteration."""
+        body = BlockNode(
+            CallFunctionNode(BinOp(".", ReferenceNode("m"), "set"), [ReferenceNode("i"), Number(1)]),
+            InPlaceAssignmentNode("+", "total", BinOp(".", BinOp("-", ReferenceNode("m"), Number(9)), "length")),
+            InPlaceAssignmentNode("+", "i", Number(1)),
+        )
+        loop = WhileNode(BinOp("<", ReferenceNode("i"), Number(3)), body)
+        ENV[-1].update(m=Map(), i=Number(0), total=Number(0))
+        tree = Optimizer(2).optimize(loop)
+
+        self.assertIsInstance(tree, HoistedLoopNode, "Nothing was hoisted")
+        tree.visit()
+        self.assertEqual(ENV[-1]["total"], Number(6), "Hoisted operation read a stale Map")
+
+    def test_level_zero(self):
+        """Test that level 0 leaves the tree alone."""
+        tree = BinOp("+", Number(1), Number(2))
+
+        self.assertIs(Optimizer(0).optimize(tree), tree, "Level 0 should not optimize")
+
+
+if __name__ == "__main__":
+    unittest.main()
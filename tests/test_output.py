@@ -0,0 +1,82 @@
+import io
+import time
+import unittest
+from contextlib import redirect_stdout
+from unittest import mock
+
+from obj_model import *
+from output import OUTPUT, Output
+
+
+class OutputTestCase(unittest.TestCase):
+    """Test cases for buffered program output."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+        self.stdout = io.StringIO()
+        redirect = redirect_stdout(self.stdout)
+        redirect.__enter__()
+        self.addCleanup(redirect.__exit__, None, None, None)
+
+    def test_size_policy(self):
+        """Test that lines are held back until the buffer is full."""
+        output = Output()
+        output.configure(size=10, policy="size")
+        output.say("12345")
+
+        self.assertEqual(self.stdout.getvalue(), "", "Line written before the buffer was full")
+        output.say("67890")
+        self.assertEqual(self.stdout.getvalue(), "12345\n67890\n", "Full buffer not written")
+
+    def test_line_policy(self):
+        """Test that the line policy writes every line at once."""
+        output = Output()
+        output.configure(policy="line")
+        output.say("hello")
+
+        self.assertEqual(self.stdout.getvalue(), "hello\n", "Line held back")
+
+    def test_time_policy(self):
+        """Test that the time policy writes once the interval has passed, without another line being said."""
+        output = Output()
+        output.configure(policy="time", interval=0.05)
+        output.say("first")
+        output.say("second")
+
+        self.assertEqual(self.stdout.getvalue(), "", "Lines written before the interval passed")
+        time.sleep(0.5)
+        self.assertEqual(self.stdout.getvalue(), "first\nsecond\n", "Lines not written after the interval")
+
+    def test_background_writer(self):
+        """Test that the background writer writes every line in order."""
+        output = Output()
+        output.configure(size=100, policy="size", background=True)
+        for number in range(1000):
+            output.say(str(number))
+        output.close()
+
+        self.assertEqual(self.stdout.getvalue(), "".join(f"{number}\n" for number in range(1000)), "Lines lost")
+
+    def test_ask(self):
+        """Test that everything said is written before a prompt."""
+        output = Output()
+        output.configure(policy="size")
+        output.say("question")
+        with mock.patch("builtins.input", lambda prompt: self.stdout.getvalue() + prompt):
+            answer = output.ask("? ")
+
+        self.assertEqual(answer, "question\n? ", "Prompt shown before earlier output")
+
+    def test_exit(self):
+        """Test that exiting writes the held back output and the message."""
+        OUTPUT.configure(policy="size")
+        self.addCleanup(OUTPUT.configure)
+        SayNode(String("last words")).visit()
+        with self.assertRaises(SystemExit):
+            ExitNode(String("bye")).visit()
+
+        self.assertEqual(self.stdout.getvalue(), "last words\nbye\n", "Output lost on exit")
+
+
+if __name__ == "__main__":
+    unittest.main()
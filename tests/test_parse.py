@@ -0,0 +1,62 @@
+import unittest
+
+from lex import Lexer
+from obj_model import *
+from parse import Parser
+
+
+class ParserTestCase(unittest.TestCase):
+    """Test cases for statement lists and streaming in the parser."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+        self.lexer = Lexer()
+
+    def test_flat_statements(self):
+        """Test that top-level and nested statement lists parse into flat blocks."""
+        program = Parser().parse(self.lexer.tokenize("a = 1; b = (1; 2; 3;); a + b;"))
+
+        self.assertEqual(len(program.exprs), 3, "Top-level statements not flat")
+        self.assertEqual(len(program.exprs[1].value.exprs), 3, "Nested statements not flat")
+        self.assertEqual(program.visit(), Number(4), "Statement list evaluated incorrectly")
+
+    def test_long_program(self):
+        """Test that very long programs parse and run without deep recursion."""
+        source = "x = 0;\n" + "x += 1;\n" * 5000 + "x;"
+        program = Parser().parse(self.lexer.tokenize(source))
+
+        self.assertEqual(len(program.exprs), 5002, "Statements were lost")
+        self.assertEqual(program.visit(), Number(5000), "Long program evaluated incorrectly")
+
+    def test_streaming(self):
+        """Test that statements are handed over as soon as they are parsed."""
+        events = []
+
+        def tokens():
+            for token in self.lexer.tokenize("x = 1; y = x + 1; y * 2;"):
+                events.append(token.type)
+                yield token
+
+        parser = Parser(on_statement=lambda statement: events.append(statement.visit().repr()))
+        program = parser.parse(tokens())
+
+        self.assertEqual(program.exprs, [], "Streamed statements should not be kept")
+        # x = 1 ; is four tokens, plus at most one token of lookahead
+        self.assertLessEqual(events.index("1"), 5, "First statement ran after later tokens were read")
+        self.assertEqual(events[-1], "4", "Statements ran out of order")
+
+    def test_syntax_error(self):
+        """Test that statements from the first syntax error on are dropped, whether streamed or collected."""
+        source = "x = 1; y = ); x = 2; x;"
+        streamed = []
+        Parser(on_statement=streamed.append).parse(self.lexer.tokenize(source))
+        parser = Parser()
+        program = parser.parse(self.lexer.tokenize(source))
+
+        self.assertTrue(parser.errors, "Syntax error not counted")
+        self.assertEqual(len(program.exprs), 1, "Statements after the syntax error were kept")
+        self.assertEqual(program.exprs, streamed, "Streamed and collected statements differ")
+
+
+if __name__ == "__main__":
+    unittest.main()
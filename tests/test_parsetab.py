@@ -0,0 +1,70 @@
+import os
+import pickle
+import tempfile
+import unittest
+
+from sly.yacc import Grammar, LRTable
+
+from parse import Parser
+from parsetab import ParseTables, grammar_key, load_tables, report_conflicts
+
+
+def fresh_grammar():
+    """An unused copy of the parser grammar; building tables changes a grammar in place."""
+    grammar = Grammar(Parser.tokens)
+    for production in Parser._grammar.Productions[1:]:
+        grammar.add_production(production.name, production.prod, production.func, production.file, production.line)
+    grammar.set_start(Parser.start)
+    return grammar
+
+
+class ParseTablesTestCase(unittest.TestCase):
+    """Test cases for the persisted parser tables."""
+
+    def test_tables_match_fresh_build(self):
+        """Test that the tables in use match the ones sly would build."""
+        fresh = LRTable(fresh_grammar())
+
+        self.assertEqual(Parser._lrtable.lr_action, fresh.lr_action, "Action table differs")
+        self.assertEqual(Parser._lrtable.lr_goto, fresh.lr_goto, "Goto table differs")
+        self.assertEqual(Parser._lrtable.defaulted_states, fresh.defaulted_states, "Default states differ")
+
+    def test_grammar_key(self):
+        """Test that the key changes with the grammar rules."""
+        rule = lambda self, p: None
+        rule.rules = ["expr PLUS expr"]
+        other = lambda self, p: None
+        other.rules = ["expr MINUS expr"]
+
+        self.assertEqual(grammar_key(Parser, [("expr", rule)]), grammar_key(Parser, [("expr", rule)]))
+        self.assertNotEqual(
+            grammar_key(Parser, [("expr", rule)]), grammar_key(Parser, [("expr", other)]), "Key ignores rules"
+        )
+
+    def test_load_tables(self):
+        """Test loading stored tables and rejecting corrupt ones."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "Parser.key.parsetab")
+            self.assertIsNone(load_tables(path), "Missing tables should not load")
+
+            with open(path, "wb") as file:
+                file.write(pickle.dumps(({0: {"NUMBER": 1}}, {0: {}}, {})))
+            self.assertIsInstance(load_tables(path), ParseTables, "Stored tables did not load")
+
+            with open(path, "wb") as file:
+                file.write(b"garbage")
+            self.assertIsNone(load_tables(path), "Corrupt tables should not load")
+
+    def test_report_conflicts(self):
+        """Test that loaded tables repeat the conflict warnings they were built with, unless expected."""
+        messages = []
+        log = type("Log", (), {"warning": lambda self, message, *args: messages.append(message % args)})()
+        grammar = type("Grammar", (), {"log": log, "expected_reduce_reduce": 2})
+        report_conflicts(grammar, ParseTables({}, {}, {}, 1, 2))
+        report_conflicts(grammar, ParseTables({}, {}, {}, 3, 0))
+
+        self.assertEqual(messages, ["1 shift/reduce conflict", "3 shift/reduce conflicts"], "Conflicts reported wrongly")
+
+
+if __name__ == "__main__":
+    unittest.main()
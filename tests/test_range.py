@@ -0,0 +1,77 @@
+import pickle
+import unittest
+
+from obj_model import *
+
+
+class RangeTestCase(unittest.TestCase):
+    """Test cases for MochaScript's lazy Range object."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_range_node(self):
+        """Test that `to` makes a Range rather than listing the numbers."""
+        result = RangeNode(Number(1), Number(10**12)).visit()
+
+        self.assertIsInstance(result, Range, "RangeNode did not make a Range")
+        self.assertEqual(len(result.numbers), 10**12, "Range has the wrong length")
+
+    def test_iteration(self):
+        """Test that iterating a Range makes its numbers one at a time."""
+        numbers = iter(Range(1, 10**12))
+
+        self.assertEqual([next(numbers), next(numbers)], [Number(1), Number(2)], "Range iteration failed")
+
+    def test_for_loop(self):
+        """Test looping over a Range."""
+        loop = ForNode(RangeNode(Number(1), Number(100)), "i", InPlaceAssignmentNode("+", "total", ReferenceNode("i")))
+        ENV[-1]["total"] = Number(0)
+        loop.visit()
+
+        self.assertEqual(ENV[-1]["total"], Number(5050), "Loop over a Range failed")
+
+    def test_contains(self):
+        """Test membership in a Range without listing it."""
+        numbers = Range(1, 10**12)
+
+        self.assertEqual(numbers.contains(Number(10**12)), Boolean(True), "Last number not in Range")
+        self.assertEqual(numbers.contains(Number(5.0)), Boolean(True), "Whole float not in Range")
+        self.assertEqual(numbers.contains(Number(5.5)), Boolean(False), "Fraction in Range")
+        self.assertEqual(numbers.contains(Number(0)), Boolean(False), "Number before start in Range")
+        self.assertEqual(numbers.contains(String("1")), Boolean(False), "String in Range")
+
+    def test_indexing(self):
+        """Test indexing a Range."""
+        numbers = Range(10, 10**12)
+
+        self.assertEqual(numbers.div(Number(5)), Number(15), "Range indexing failed")
+        self.assertEqual(numbers.div(Number(-1)), Number(10**12), "Negative Range indexing failed")
+
+    def test_array_operations(self):
+        """Test that operations without a Range version work on the listed numbers."""
+        numbers = Range(1, 3)
+
+        self.assertEqual(numbers, Array([Number(1), Number(2), Number(3)]), "Range not equal to its Array")
+        self.assertEqual(numbers.add(Number(4)), Range(1, 4), "Range appending failed")
+        self.assertEqual(numbers.neg(), Array([Number(3), Number(2), Number(1)]), "Range reversing failed")
+        self.assertEqual(numbers.repr(), "[1, 2, 3]", "Range repr() incorrect")
+
+    def test_reversing(self):
+        """Test reversing a Range without listing it."""
+        numbers = Range(1, 10**12).neg()
+
+        self.assertIsInstance(numbers, Range, "Reversed Range was listed")
+        self.assertEqual(numbers.div(Number(0)), Number(10**12), "Reversed Range starts wrongly")
+        self.assertEqual(numbers.div(Number(-1)), Number(1), "Reversed Range ends wrongly")
+        self.assertEqual(numbers.contains(Number(5)), Boolean(True), "Number missing from reversed Range")
+        self.assertEqual(numbers.neg(), Range(1, 10**12), "Reversing twice changed the Range")
+
+    def test_pickling(self):
+        """Test that Ranges survive the program cache."""
+        for numbers in (Range(1, 10**12), Range(1, 10**12).neg()):
+            self.assertEqual(pickle.loads(pickle.dumps(numbers)), numbers, "Unpickled Range changed")
+
+
+if __name__ == "__main__":
+    unittest.main()
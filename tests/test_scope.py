@@ -0,0 +1,130 @@
+import gc
+import tracemalloc
+import unittest
+
+from helpers import ENGINES, parse, run_source
+from obj_model import *
+
+
+class ScopeTestCase(unittest.TestCase):
+    """Test cases for variable resolution and call frames."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_slots(self):
+        """Test that parameters and assigned names get slots and other names stay global."""
+        source = "fn (a, b) -> (c = a; for i in b (c += i); c + g;);"
+        function = parse(source).exprs[0]
+        resolve(function)
+
+        self.assertEqual(function.scope.names, ["a", "b", "c", "i"], "Wrong local variables")
+        reference = function.body.exprs[-1].left
+        self.assertEqual(reference.places, (), "Global resolved as local")
+
+    def test_frame_size(self):
+        """Test that call frames only hold the variables of the function, however many globals exist."""
+        for index in range(1000):
+            ENV[-1][f"g{index}"] = Number(index)
+        probe = FrameProbe()
+        function = Function(BlockNode(AssignmentNode("c", ReferenceNode("g999")), probe), ["a", "b"])
+        function.call({"a": Number(1), "b": Number(2)})
+
+        self.assertEqual(
+            probe.frame.slots, [Number(1), Number(2), Number(999)], "Frame is not sized by the function"
+        )
+
+    def test_repeated_call_site(self):
+        """Test that a call site can run more than once."""
+        source = "double = fn double(x) -> (x * 2); total = 0; for i in 1 to 3 (total += (double(i))); total;"
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Number(12)), "Repeated call failed")
+
+    def test_local_assignment(self):
+        """Test that assignments in a function stay local and read the outer value until then."""
+        source = "x = 10; f = fn f() -> (y = x; x = 5; x + y;); r = f(); r * 100 + x;"
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Number(1510)), "Local assignment leaked")
+
+    def test_closures(self):
+        """Test that nested functions read the variables of the call that created them."""
+        source = "make = fn make(n) -> (fn (v) -> (v + n)); a = make(1); b = make(2); (a(10)) * (b(10));"
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Number(132)), "Closures share a frame")
+
+    def test_nested_depth(self):
+        """Test reading variables of functions two levels out."""
+        source = "f = fn f(a) -> (g = fn (b) -> (h = fn (c) -> (a + b + c); h(3);); g(2););  f(1);"
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Number(6)), "Nested variable read failed")
+
+    def test_shared_cells(self):
+        """Test that closures see later assignments made by the call that created them."""
+        source = "f = fn f() -> (x = 1; g = fn g() -> (x); x = 2; g();); f();"
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Number(2)), "Closure read a stale value")
+
+    def test_shadowed_variable(self):
+        """Test that a local that shadows a captured variable reads it until assigned."""
+        source = "make = fn make(n) -> (fn (v) -> (n = n + v; n;)); a = make(10); a(1); a(1);"
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Number(11)), "Shadowed variable read failed")
+
+    def test_closure_retained_memory(self):
+        """Test that closures keep only the variables they use alive."""
+        source = "make = fn make(n) -> (big = 1 to 2000; fn (v) -> (v + n););"
+        source += "".join(f"f{index} = make({index});" for index in range(50))
+        tree = parse(source)
+
+        gc.collect()
+        tracemalloc.start()
+        try:
+            tree.visit()
+            gc.collect()
+            retained = tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+        self.assertEqual(len(ENV[-1]["f0"].closure), 1, "Closure captured more than its free variable")
+        # Keeping the 50 calls' arrays alive would take about 10 MB
+        self.assertLess(retained, 512 * 1024, "Closures keep their whole call alive")
+
+    def test_tail_call_marking(self):
+        """Test that only calls whose result is the function's result are marked as tail calls."""
+        source = "fn f(n) -> (g(n); (h(n) if n else 1 + (k(n)));); "
+        function = parse(source).exprs[0]
+        resolve(function)
+
+        first, branch = function.body.exprs
+        self.assertFalse(first.tail, "Call before the last expression marked")
+        self.assertTrue(branch.true_block.tail, "Call in an if branch not marked")
+        self.assertFalse(branch.false_block.left.tail, "Call inside an operation marked")
+
+    def test_deep_tail_recursion(self):
+        """Test that tail recursion runs far deeper than the Python stack in constant frames."""
+        source = "count = fn count(n, acc) -> ((acc if n == 0 else count(n - 1, acc + 1))); count(100000, 0);"
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Number(100000)), "Deep tail recursion failed")
+        self.assertEqual(FRAMES, [None], "Tail calls left frames behind")
+
+    def test_mutual_tail_recursion(self):
+        """Test tail calls between different functions, through both forms of if."""
+        source = (
+            "even = fn even(n) -> (if n == 0 (true) else (odd(n - 1)));"
+            "odd = fn odd(n) -> ((false if n == 0 else even(n - 1)));"
+            "even(20001);"
+        )
+
+        self.assertEqual(run_source(source), dict.fromkeys(ENGINES, Boolean(False)), "Mutual tail recursion failed")
+
+
+class FrameProbe(SpecialExpression):
+    """A node that records the frame it runs in."""
+
+    def visit(self):
+        self.frame = FRAMES[-1]
+        return Boolean(True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import pickle
+import unittest
+
+from helpers import run_source
+from obj_model import *
+
+
+class SetTestCase(unittest.TestCase):
+    """Test cases for MochaScript's Set object."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_hashing(self):
+        """Test that equal values hash alike and can be found in a set."""
+        values = Set([Number(1), String("a"), Boolean(False), Array([Number(1), Number(2)])])
+
+        self.assertEqual(values.contains(Number(1.0)), Boolean(True), "Equal float not found")
+        self.assertEqual(values.contains(String("a")), Boolean(True), "String not found")
+        self.assertEqual(values.contains(Range(1, 2)), Boolean(True), "Equal Range not found")
+        self.assertEqual(values.contains(Boolean(True)), Boolean(False), "Wrong Boolean found")
+        self.assertEqual(values.contains(Set()), Boolean(False), "Unhashable value found")
+
+    def test_operations(self):
+        """Test union, difference and adding and removing elements."""
+        values = Set([Number(1), Number(2)])
+
+        self.assertEqual(values.add(Number(3)), Set([Number(1), Number(2), Number(3)]), "Adding failed")
+        self.assertEqual(values.add(Set([Number(2), Number(4)])).getattr("length"), Number(3), "Union failed")
+        self.assertEqual(values.sub(Set([Number(1), Number(5)])), Set([Number(2)]), "Difference failed")
+        self.assertEqual(values, Set([Number(2), Number(1)]), "Operation changed the set")
+
+        values.getattr("add").call({"value": Number(7)})
+        values.getattr("remove").call({"value": Number(1)})
+        self.assertEqual(values, Set([Number(2), Number(7)]), "Adding or removing in place failed")
+        with self.assertRaises(SystemExit):
+            values.getattr("remove").call({"value": Number(1)})
+        with self.assertRaises(SystemExit):
+            values.add(Map())
+
+    def test_literal(self):
+        """Test that a set literal makes a new set on every evaluation, with every engine."""
+        source = "f = fn f(x) -> ({x, \"a\", x}); s = f(1); (s.add(2)); t = f(1); t + {[1, 2]};"
+        expected = Set([Number(1), String("a"), Array([Number(1), Number(2)])])
+
+        for engine, result in run_source(source).items():
+            with self.subTest(engine=engine):
+                self.assertEqual(result, expected, "Set literal failed")
+                self.assertEqual(result.repr(), '{1, "a", [1, 2]}', "Set repr() incorrect")
+
+    def test_set_builtin(self):
+        """Test making sets from arrays and ranges."""
+        make = ENV[-1]["set"]
+
+        self.assertEqual(make.call({"values": Range(1, 2)}), Set([Number(1), Number(2)]), "Set from Range failed")
+        self.assertEqual(make.call({"values": Array()}).repr(), "set([])", "Empty set repr() incorrect")
+        with self.assertRaises(SystemExit):
+            make.call({"values": Number(1)})
+
+    def test_pickling(self):
+        """Test that Sets can be pickled."""
+        values = Set([Number(1), String("a")])
+
+        self.assertEqual(pickle.loads(pickle.dumps(values)), values, "Unpickled Set changed")
+
+
+if __name__ == "__main__":
+    unittest.main()
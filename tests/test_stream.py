@@ -0,0 +1,72 @@
+import os
+import tempfile
+import unittest
+
+from helpers import call
+from obj_model import *
+
+
+class StreamTestCase(unittest.TestCase):
+    """Test cases for reading files a line or chunk at a time, and writing them."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "data.txt")
+        with open(self.path, "w") as file:
+            file.write("first\nsecond\r\nlast")
+
+    def test_lines(self):
+        """Test going over the lines of a file without their line endings."""
+        stream = call("lines", path=String(self.path))
+
+        self.assertEqual(list(stream), [String("first"), String("second"), String("last")], "Lines read wrongly")
+        self.assertEqual(list(stream), list(stream), "Second loop did not start over")
+
+    def test_chunks(self):
+        """Test going over a file a fixed number of characters at a time."""
+        stream = call("chunks", path=String(self.path), size=Number(7))
+
+        self.assertEqual(
+            list(stream), [String("first\ns"), String("econd\nl"), String("ast")], "Chunks read wrongly"
+        )
+
+    def test_for_loop(self):
+        """Test that a for-loop reads one line at a time."""
+        ENV[-1]["total"] = Number(0)
+        loop = ForNode(
+            CallFunctionNode(ReferenceNode("lines"), [String(self.path)]),
+            "line",
+            InPlaceAssignmentNode("+", "total", Number(1)),
+        )
+        loop.visit()
+
+        self.assertEqual(ENV[-1]["total"], Number(3), "Loop over lines failed")
+
+    def test_write(self):
+        """Test writing a string, and appending the items of an array and the lines of a file one per line."""
+        copy = String(self.path + ".copy")
+        call("write", path=copy, values=String("start\n"))
+        call("append", path=copy, values=Array([Number(1), String("two")]))
+        call("append", path=copy, values=call("lines", path=String(self.path)))
+
+        with open(copy.value) as file:
+            self.assertEqual(file.read(), "start\n1\ntwo\nfirst\nsecond\nlast\n", "File written wrongly")
+
+    def test_errors(self):
+        """Test that missing files and wrong arguments abort."""
+        with self.assertRaises(SystemExit):
+            list(call("lines", path=String(self.path + ".missing")))
+        with self.assertRaises(SystemExit):
+            call("chunks", path=String(self.path), size=Number(0))
+        with self.assertRaises(SystemExit):
+            call("write", path=String(self.path), values=Number(1))
+
+    def test_repr(self):
+        """Test Stream repr()."""
+        self.assertEqual(Stream("log.txt", 10).repr(), 'chunks("log.txt", 10)', "Stream repr() incorrect")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,7 @@
+import pickle
 import unittest
 
+from lex import Lexer
 from obj_model import *
 
 
@@ -54,6 +56,18 @@ class StringTestCase(unittest.TestCase):
 
         self.assertEqual(hello.mod(world), expected, "String formatting/modulus failed")
 
+    def test_format_arguments(self):
+        """Test formatting with positions, names and every field filled by one value."""
+        numbers = Array([Number(1), Number(2)])
+        names = Map([(String("who"), String("you")), (Number(0), Number(5))])
+
+        self.assertEqual(String("{} {}").mod(Number(7)), String("7 7"), "One value did not fill every field")
+        self.assertEqual(String("{1}{{0}}{}").mod(numbers), String("2{1}1"), "Positional formatting failed")
+        self.assertEqual(String("{who}: {0}").mod(names), String("you: 5"), "Named formatting failed")
+        self.assertIs(format_template("{who}: {0}"), format_template("{who}: {0}"), "Template parsed again")
+        with self.assertRaises(SystemExit):
+            String("{} {} {}").mod(numbers)
+
     def test_uppercase(self):
         """Test String uppercasing (positive)."""
         string = String("fox")
@@ -68,6 +82,31 @@ class StringTestCase(unittest.TestCase):
 
         self.assertEqual(string.neg(), expected, "String lowercasing failed")
 
+    def test_slice(self):
+        """Test String slicing and shared one-character strings."""
+        string = String("a\"bc\"")
+
+        self.assertEqual(string.slice(1, None), String('"bc"'), "String slicing kept or lost quotes")
+        self.assertIs(string.div(Number(0)), string.div(Number(0)), "Character strings not shared")
+
+    def test_escapes(self):
+        """Test that the lexer replaces escapes in string literals, once."""
+        token = next(Lexer().tokenize(r'"a\tb\nc\\n\q"'))
+
+        self.assertEqual(token.value, "a\tb\nc\\n\\q", "Escapes replaced wrongly")
+        self.assertEqual(String(token.value).value, token.value, "String changed its text")
+
+    def test_builder(self):
+        """Test that long concatenations share their pieces and join them when the text is needed."""
+        line = String("x" * FLAT_STRING_LIMIT)
+        text = line.add(String("a")).add(String("b"))
+        other = line.add(String("a")).add(String("c"))
+
+        self.assertIsNone(text.text, "Concatenation joined the pieces right away")
+        self.assertEqual(text.value, "x" * FLAT_STRING_LIMIT + "ab", "Joined text incorrect")
+        self.assertEqual(other, String("x" * FLAT_STRING_LIMIT + "ac"), "Concatenation changed a shared string")
+        self.assertEqual(pickle.loads(pickle.dumps(other)), other, "Unpickled string changed")
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,66 @@
+import pickle
+import unittest
+
+from helpers import run_source
+from obj_model import *
+
+
+class StructTestCase(unittest.TestCase):
+    """Test cases for MochaScript's structs and their records."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def test_records(self):
+        """Test making records and reading their fields."""
+        point = Struct(("x", "y"), name="point")
+        record = point.call({"x": Number(1), "y": String("a")})
+
+        self.assertEqual(record.getattr("y"), String("a"), "Field read failed")
+        self.assertEqual(record.repr(), 'point(x=1, y="a")', "Record repr() incorrect")
+        self.assertEqual(record, point.call({"x": Number(1), "y": String("a")}), "Equal records differ")
+        self.assertEqual(hash(record), hash(point.call({"x": Number(1), "y": String("a")})), "Equal records hash apart")
+        self.assertNotEqual(record, Struct(("x", "y")).call({"x": Number(1), "y": String("a")}), "Structs mixed up")
+        with self.assertRaises(SystemExit):
+            record.getattr("z")
+        with self.assertRaises(SystemExit):
+            point.call({"x": Number(1)})
+        with self.assertRaises(SystemExit):
+            Struct(("x", "x"))
+
+    def test_inline_cache(self):
+        """Test that a `.` node caches the field position for the last struct and rechecks it."""
+        node = BinOp(".", ReferenceNode("r"), "y")
+        first, second = Struct(("x", "y")), Struct(("y",))
+
+        ENV[-1]["r"] = first.call({"x": Number(1), "y": Number(2)})
+        self.assertEqual(node.visit(), Number(2), "First read failed")
+        self.assertIs(node.receiver, first, "Struct not cached")
+        self.assertEqual(node.offset, 1, "Wrong field position cached")
+
+        ENV[-1]["r"] = second.call({"y": Number(3)})
+        self.assertEqual(node.visit(), Number(3), "Read from another struct used the stale position")
+        ENV[-1]["r"] = Map([(String("y"), Number(4))])
+        self.assertEqual(node.visit(), Number(4), "Read from a map failed")
+
+    def test_engines(self):
+        """Test structs with every engine."""
+        source = "point = struct point(x, y); f = fn f(p) -> ((p.x) * (p.y)); t = 0;"
+        source += "for i in 1 to 10 (t += (f(point(i, 2)))); t;"
+
+        for engine, result in run_source(source).items():
+            with self.subTest(engine=engine):
+                self.assertEqual(result, Number(110), "Struct program failed")
+
+    def test_pickling(self):
+        """Test that records keep their struct through pickling."""
+        point = Struct(("x", "y"))
+        records = [point.call({"x": Number(1), "y": Number(2)}), point.call({"x": Number(3), "y": Number(4)})]
+        first, second = pickle.loads(pickle.dumps(records))
+
+        self.assertIs(first.shape, second.shape, "Records of one struct unpickled with different structs")
+        self.assertEqual(second.getattr("y"), Number(4), "Unpickled record changed")
+
+
+if __name__ == "__main__":
+    unittest.main()
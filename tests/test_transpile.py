@@ -0,0 +1,70 @@
+import os
+import tempfile
+import unittest
+
+from lex import Lexer
+from obj_model import *
+from parse import Parser
+from transpile import PythonProgram, Transpiler, load_cached, store_cached
+
+
+class TranspileTestCase(unittest.TestCase):
+    """Test cases for the Python transpiler backend."""
+
+    lexer, parser = Lexer(), Parser()
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def transpile(self, source):
+        """Transpile MochaScript source code into a PythonProgram."""
+        return Transpiler().transpile(self.parser.parse(self.lexer.tokenize(source)))
+
+    def test_arithmetic(self):
+        """Test binary and unary operations."""
+        self.assertEqual(self.transpile("-(1 + 2 * 3);").run(), Number(-7), "Arithmetic failed")
+
+    def test_loops(self):
+        """Test while- and for-loops."""
+        source = "i = 0; total = 0; while i < 5 (total += i; i += 1;); for n in 1 to 3 (total += n); total;"
+
+        self.assertEqual(self.transpile(source).run(), Number(16), "Loops failed")
+
+    def test_if_expression(self):
+        """Test both branches of an if-expression."""
+        self.assertEqual(self.transpile('(1 if 2 > 1 else "no");').run(), Number(1), "True branch failed")
+        self.assertEqual(self.transpile('(1 if 2 < 1 else "no");').run(), String("no"), "False branch failed")
+
+    def test_function_calls(self):
+        """Test calling a transpiled function repeatedly."""
+        source = "double = fn double(x) -> (x * 2); i = 1; (i = (double(i)) while i < 100);"
+
+        self.assertEqual(self.transpile(source).run(), Number(128), "Function calls failed")
+
+    def test_evaluation_order(self):
+        """Test that operands are evaluated left to right."""
+        source = "x = 1; x + (x = 10);"
+
+        self.assertEqual(self.transpile(source).run(), Number(11), "Evaluation order changed")
+
+    def test_serialization(self):
+        """Test that a program survives a round trip through the cache format."""
+        program = PythonProgram.loads(self.transpile('"a" * 3;').dumps())
+
+        self.assertEqual(program.run(), String("aaa"), "Serialized program failed")
+
+    def test_cache(self):
+        """Test storing and loading cached programs."""
+        source = "1 + 1;"
+        with tempfile.TemporaryDirectory() as directory:
+            script = os.path.join(directory, "script.mocha")
+            self.assertIsNone(load_cached(script, source), "Cache should start empty")
+
+            store_cached(script, source, self.transpile(source))
+
+            self.assertEqual(load_cached(script, source).run(), Number(2), "Cached program failed")
+            self.assertIsNone(load_cached(script, "1 + 2;"), "Changed source should miss the cache")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+
+import obj_model
+from obj_model import *
+
+
+class VectorTestCase(unittest.TestCase):
+    """Test cases for element-wise Vector math, with NumPy if it is installed."""
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def vec(self, *numbers):
+        return Vector.of(Array([Number(number) for number in numbers]))
+
+    def test_conversion(self):
+        """Test making vectors from arrays and ranges, and turning them back into arrays."""
+        vector = ENV[-1]["vec"].call({"values": RangeNode(Number(1), Number(3)).visit()})
+
+        self.assertEqual(vector, self.vec(1, 2, 3), "Range conversion failed")
+        self.assertEqual(vector.getattr("array"), Array([Number(1), Number(2), Number(3)]), "Array conversion failed")
+
+    def test_arithmetic(self):
+        """Test element-wise arithmetic with vectors and numbers."""
+        vector = self.vec(1, 2, 4)
+
+        self.assertEqual(vector.add(self.vec(1, 1, 1)), self.vec(2, 3, 5), "Vector addition failed")
+        self.assertEqual(vector.mul(Number(2)), self.vec(2, 4, 8), "Scaling failed")
+        self.assertEqual(Number(1).sub(vector), self.vec(0, -1, -3), "Number-first subtraction failed")
+        self.assertEqual(vector.exp(Number(2)), self.vec(1, 4, 16), "Power failed")
+        self.assertEqual(vector.neg(), self.vec(-1, -2, -4), "Negation failed")
+
+    def test_comparison(self):
+        """Test that comparisons give vectors of 1s and 0s."""
+        self.assertEqual(self.vec(1, 2, 4).gt(Number(1.5)), self.vec(0, 1, 1), "Comparison failed")
+
+    def test_number_first_comparison(self):
+        """Test that comparing a number with a vector compares it with each element."""
+        vector = self.vec(1, 2, 3)
+
+        self.assertEqual(Number(2).lt(vector), self.vec(0, 0, 1), "Number-first < failed")
+        self.assertEqual(Number(2).gt(vector), self.vec(1, 0, 0), "Number-first > failed")
+        self.assertEqual(Number(2).le(vector), self.vec(0, 1, 1), "Number-first <= failed")
+        self.assertEqual(Number(2).ge(vector), self.vec(1, 1, 0), "Number-first >= failed")
+        self.assertEqual(Number(2).eq(vector), self.vec(0, 1, 0), "Number-first == failed")
+        self.assertEqual(Number(2).ne(vector), self.vec(1, 0, 1), "Number-first != failed")
+
+    def test_reductions(self):
+        """Test the sum, min, max, mean and length of a vector."""
+        vector = self.vec(3, 1, 2)
+
+        self.assertEqual(vector.getattr("sum"), Number(6), "Sum failed")
+        self.assertEqual(vector.getattr("min"), Number(1), "Min failed")
+        self.assertEqual(vector.getattr("max"), Number(3), "Max failed")
+        self.assertEqual(vector.getattr("mean"), Number(2), "Mean failed")
+        self.assertEqual(vector.getattr("length"), Number(3), "Length failed")
+
+    def test_errors(self):
+        """Test that mismatched lengths and division by zero abort."""
+        with self.assertRaises(SystemExit):
+            self.vec(1, 2).add(self.vec(1, 2, 3))
+        with self.assertRaises(SystemExit):
+            self.vec(1, 2).div(Number(0))
+        with self.assertRaises(SystemExit):
+            Vector.of(Array([String("a")]))
+
+    def test_repr(self):
+        """Test Vector repr()."""
+        self.assertEqual(self.vec(1, 2.5).repr(), "vec([1, 2.5])", "Vector repr() incorrect")
+
+
+class FallbackVectorTestCase(VectorTestCase):
+    """Test cases for element-wise Vector math without NumPy."""
+
+    def setUp(self):
+        super().setUp()
+        self.numpy, obj_model.numpy = obj_model.numpy, None
+
+    def tearDown(self):
+        obj_model.numpy = self.numpy
+
+
+if __name__ == "__main__":
+    unittest.main()
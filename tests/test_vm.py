@@ -0,0 +1,77 @@
+import unittest
+
+from compiler import *
+from lex import Lexer
+from parse import Parser
+from vm import VM
+
+
+class VMTestCase(unittest.TestCase):
+    """Test cases for the bytecode compiler and VM."""
+
+    lexer, parser = Lexer(), Parser()
+
+    def setUp(self):
+        ENV[:] = [MSEnv()]
+
+    def run_source(self, source):
+        """Compile and run MochaScript source code on the VM."""
+        ast = self.parser.parse(self.lexer.tokenize(source))
+        return VM().run(Compiler().compile(ast))
+
+    def test_arithmetic(self):
+        """Test binary and unary operations."""
+        self.assertEqual(self.run_source("-(1 + 2 * 3);"), Number(-7), "Arithmetic failed")
+
+    def test_while_loop(self):
+        """Test a counting while-loop."""
+        source = "counter = 0; total = 0; while counter <= 10 (total += counter; counter += 1;); total;"
+
+        self.assertEqual(self.run_source(source), Number(55), "While-loop failed")
+
+    def test_for_loop(self):
+        """Test a for-loop over a range."""
+        source = "total = 0; for i in 1 to 4 (total += i); total;"
+
+        self.assertEqual(self.run_source(source), Number(10), "For-loop failed")
+
+    def test_if_expression(self):
+        """Test both branches of an if-expression."""
+        self.assertEqual(self.run_source('(1 if 2 > 1 else "no");'), Number(1), "True branch failed")
+        self.assertEqual(self.run_source('(1 if 2 < 1 else "no");'), String("no"), "False branch failed")
+
+    def test_repeated_calls(self):
+        """Test calling a function from a loop."""
+        source = "double = fn double(x) -> (x * 2); i = 0; (i = (double(i)) + 1 while i < 20);"
+
+        self.assertEqual(self.run_source(source), Number(31), "Repeated function calls failed")
+
+    def test_deep_recursion(self):
+        """Test that recursion is not limited by the Python stack."""
+        source = "down = fn down(n) -> ((n if n <= 0 else down(n - 1))); down(5000);"
+
+        self.assertEqual(self.run_source(source), Number(0), "Deep recursion failed")
+
+    def test_short_circuit(self):
+        """Test that short-circuiting operations skip their right operand."""
+        tree = LogicalNode("||", Boolean(True), ReferenceNode("undefined"))
+
+        self.assertEqual(VM().run(Compiler().compile(tree)), Boolean(True), "Short-circuit failed")
+
+    def test_fallback_node(self):
+        """Test that nodes without a lowering are evaluated by the tree-walker."""
+        code = Compiler().compile(BlockNode(AssignmentNode("x", Number(2)), UnknownNode()))
+
+        self.assertIn("EVAL_NODE", code.disassemble(), "Fallback instruction missing")
+        self.assertEqual(VM().run(code), Number(2), "Fallback evaluation failed")
+
+
+class UnknownNode(SpecialExpression):
+    """A node the compiler has no dedicated lowering for."""
+
+    def visit(self):
+        return ENV[-1]["x"]
+
+
+if __name__ == "__main__":
+    unittest.main()
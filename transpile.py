@@ -0,0 +1,382 @@
+import ast
+import importlib.util
+import marshal
+import os
+import pickle
+
+import cache
+from obj_model import *
+
+TRANSPILER_VERSION = 4
+
+
+class PythonFunction(Function):
+    """Function whose body has been transpiled to a Python function."""
+
+    __slots__ = ()
+
+    def __init__(self, body, parameters, name=None, scope=None, closure=None):
+        super().__init__(body, list(parameters), closure, name=name)
+        self.scope = scope
+
+    def run(self, arguments):
+        """Run the body once; a call in tail position is returned as a TailCall."""
+        FRAMES.append(Frame(self.scope, self.closure, [arguments.get(name) for name in self.parameters]))
+        try:
+            return self.body(ENV[-1], FRAMES[-1])
+        finally:
+            FRAMES.pop()
+
+
+def _undefined(name):
+    abort(f"Undefined variable '{name}'")
+
+
+def _call(function, arguments):
+    if not hasattr(function, "call"):
+        abort(f"{function.repr()} is not a callable object!")
+    return function.call(dict(zip(function.parameters, arguments)))
+
+
+def _tail_call(function, arguments):
+    if not isinstance(function, Function):
+        return _call(function, arguments)
+    return TailCall(function, dict(zip(function.parameters, arguments)))
+
+
+def _iterate(iterable):
+    if not isinstance(iterable, ITERABLES):
+        abort("For-loop can only accept an iterator")
+    return iterable
+
+
+def _range(start, end):
+    return Range(int(start.value), int(end.value))
+
+
+RUNTIME = {
+    "ENV": ENV,
+    "Array": Array,
+    "Boolean": Boolean,
+    "String": String,
+    "PythonFunction": PythonFunction,
+    "abort": abort,
+    "ask": ask,
+    "say": say,
+    "_undefined": _undefined,
+    "_call": _call,
+    "_tail_call": _tail_call,
+    "_iterate": _iterate,
+    "_range": _range,
+    "_capture": capture,
+}
+
+
+def _load(name):
+    return ast.Name(id=name, ctx=ast.Load())
+
+
+def _store(name):
+    return ast.Name(id=name, ctx=ast.Store())
+
+
+def _attribute(value, attr):
+    return ast.Attribute(value=value, attr=attr, ctx=ast.Load())
+
+
+def _method(value, method, *args):
+    return ast.Call(func=_attribute(value, method), args=list(args), keywords=[])
+
+
+def _function(name, *args):
+    return ast.Call(func=_load(name), args=list(args), keywords=[])
+
+
+def _env_item(name, ctx):
+    return ast.Subscript(value=_load("env"), slice=ast.Constant(name), ctx=ctx)
+
+
+def _place(kind, index, ctx=ast.Load()):
+    if kind == FREE:
+        cell = ast.Subscript(value=_attribute(_load("frame"), "closure"), slice=ast.Constant(index), ctx=ast.Load())
+        return ast.Attribute(value=cell, attr="value", ctx=ctx)
+    slot_ctx = ctx if kind == LOCAL else ast.Load()
+    slot = ast.Subscript(value=_attribute(_load("frame"), "slots"), slice=ast.Constant(index), ctx=slot_ctx)
+    return slot if kind == LOCAL else ast.Attribute(value=slot, attr="value", ctx=ctx)
+
+
+class PythonProgram:
+    """A MochaScript program transpiled to a Python code object."""
+
+    def __init__(self, code, consts):
+        self.code = code
+        self.consts = consts
+
+    def run(self):
+        """Run the program in the current environment and return its result."""
+        namespace = {**RUNTIME, "_consts": self.consts}
+        exec(self.code, namespace)
+        return namespace["_main"](ENV[-1], FRAMES[-1])
+
+    def dumps(self):
+        """Serialize the program for the on-disk cache."""
+        return pickle.dumps((marshal.dumps(self.code), self.consts))
+
+    @classmethod
+    def loads(cls, data):
+        """Deserialize a program produced by `dumps`."""
+        code, consts = pickle.loads(data)
+        return cls(marshal.loads(code), consts)
+
+
+class Transpiler:
+    """Translates a MochaScript syntax tree into a Python module."""
+
+    def __init__(self):
+        self.consts = []
+        self.functions = []
+        self.temps = 0
+        self._dispatch = {}
+
+    def transpile(self, node, filename="<mochascript>"):
+        """Transpile a syntax tree and compile it into a PythonProgram."""
+        return PythonProgram(compile(self.module(node), filename, "exec"), self.consts)
+
+    def module(self, node):
+        """Build the `ast.Module` for a syntax tree."""
+        main = self.function_def("_main", node)
+        consts = [
+            ast.Assign(
+                targets=[_store(f"_c{index}")],
+                value=ast.Subscript(value=_load("_consts"), slice=ast.Constant(index), ctx=ast.Load()),
+            )
+            for index in range(len(self.consts))
+        ]
+        return ast.fix_missing_locations(ast.Module(body=consts + self.functions + [main], type_ignores=[]))
+
+    def function_def(self, name, node):
+        """Build a Python function that evaluates `node` with the globals `env` and the call `frame`."""
+        function = ast.parse(f"def {name}(env, frame): pass").body[0]
+        function.body = []
+        function.body.append(ast.Return(self.expr(node, function.body)))
+        return function
+
+    def expr(self, node, body):
+        """Return a Python expression for `node`, appending any statements it needs to `body`."""
+        node_type = type(node)
+        method = self._dispatch.get(node_type)
+        if method is None:
+            for cls in node_type.__mro__:
+                method = getattr(self, f"transpile_{cls.__name__}", None)
+                if method is not None:
+                    break
+            self._dispatch[node_type] = method
+        return method(node, body)
+
+    def temp(self):
+        """Return a fresh temporary variable name."""
+        self.temps += 1
+        return f"_t{self.temps}"
+
+    def assign(self, body, name, value):
+        body.append(ast.Assign(targets=[_store(name)], value=value))
+
+    def bind(self, body, value):
+        """Make sure `value` is evaluated once, returning a name that holds it."""
+        if isinstance(value, ast.Name):
+            return value
+        name = self.temp()
+        self.assign(body, name, value)
+        return _load(name)
+
+    def spill(self, body, mark, value):
+        """Evaluate `value` before the statements emitted after `mark` to keep evaluation order."""
+        if len(body) == mark or isinstance(value, (ast.Name, ast.Constant)):
+            return value
+        name = self.temp()
+        body.insert(mark, ast.Assign(targets=[_store(name)], value=value))
+        return _load(name)
+
+    def const(self, value):
+        for index, const in enumerate(self.consts):
+            if const is value:
+                return _load(f"_c{index}")
+        self.consts.append(value)
+        return _load(f"_c{len(self.consts) - 1}")
+
+    def transpile_Atom(self, node, body):
+        return self.const(node)
+
+    def transpile_Function(self, node, body):
+        if node.scope is None:
+            resolve(node)
+        index = len(self.functions)
+        self.functions.append(None)
+        name = f"_fn{index}"
+        self.functions[index] = self.function_def(name, node.body)
+        scope = self.const(node.scope)
+        # Functions nested in another function close over the cells of this call
+        closure = _function("_capture", _load("frame"), scope) if node.scope.enclosing else ast.Constant(None)
+        return _function(
+            "PythonFunction", _load(name), ast.Constant(tuple(node.parameters)), ast.Constant(node.name), scope, closure
+        )
+
+    def transpile_SpecialExpression(self, node, body):
+        # Nodes without a dedicated translation are evaluated by the tree-walker
+        return _method(self.const(node), "visit")
+
+    def transpile_BlockNode(self, node, body):
+        exprs = node.flatten()
+        if not exprs:
+            return ast.Constant(None)
+        for expr in exprs[:-1]:
+            value = self.expr(expr, body)
+            if not isinstance(value, (ast.Name, ast.Constant)):
+                body.append(ast.Expr(value=value))
+        return self.expr(exprs[-1], body)
+
+    def transpile_BinOp(self, node, body):
+        left = self.expr(node.right, body)
+        if node.op == ".":
+            return _method(self.const(node.as_getattr()), "load", left)
+        mark = len(body)
+        right = self.expr(node.left, body)
+        return _method(self.spill(body, mark, left), BINOP_TO_FUNC_MAP[node.op], right)
+
+    def transpile_LogicalNode(self, node, body):
+        result = self.temp()
+        self.assign(body, result, _function("Boolean", _attribute(self.expr(node.right, body), "value")))
+        rest = []
+        self.assign(rest, result, _function("Boolean", _attribute(self.expr(node.left, rest), "value")))
+        test = _attribute(_load(result), "value")
+        if node.op == "||":
+            test = ast.UnaryOp(op=ast.Not(), operand=test)
+        body.append(ast.If(test=test, body=rest, orelse=[]))
+        return _load(result)
+
+    def transpile_UnOp(self, node, body):
+        return _method(self.expr(node.value, body), UNOP_TO_FUNC_MAP[node.op])
+
+    def transpile_IfNode(self, node, body):
+        condition = self.expr(node.condition, body)
+        result = self.temp()
+        true_body, false_body = [], []
+        self.assign(true_body, result, self.expr(node.true_block, true_body))
+        self.assign(false_body, result, self.expr(node.false_block, false_body))
+        test = _attribute(condition, "value")
+        body.append(ast.If(test=test, body=true_body, orelse=false_body))
+        return _load(result)
+
+    def transpile_WhileNode(self, node, body):
+        result = self.temp()
+        self.assign(body, result, ast.Constant(None))
+        loop_body = []
+        condition = _attribute(self.expr(node.condition, loop_body), "value")
+        if loop_body:
+            # The condition needs statements of its own, so test it inside the loop
+            loop_body.append(ast.If(test=ast.UnaryOp(op=ast.Not(), operand=condition), body=[ast.Break()], orelse=[]))
+            condition = ast.Constant(True)
+        self.assign(loop_body, result, self.expr(node.block, loop_body))
+        body.append(ast.While(test=condition, body=loop_body, orelse=[]))
+        return _load(result)
+
+    def transpile_ForNode(self, node, body):
+        result, item = self.temp(), self.temp()
+        self.assign(body, result, ast.Constant(None))
+        iterable = _function("_iterate", self.expr(node.iterator, body))
+        loop_body = [ast.Assign(targets=[self.target(node, node.var)], value=_load(item))]
+        self.assign(loop_body, result, self.expr(node.body, loop_body))
+        body.append(ast.For(target=_store(item), iter=iterable, body=loop_body, orelse=[]))
+        return _load(result)
+
+    def transpile_LoopInvariantNode(self, node, body):
+        return self.expr(node.expr, body)
+
+    def transpile_HoistedLoopNode(self, node, body):
+        return self.expr(node.loop, body)
+
+    def transpile_RangeNode(self, node, body):
+        start = self.expr(node.start, body)
+        mark = len(body)
+        end = self.expr(node.end, body)
+        return _function("_range", self.spill(body, mark, start), end)
+
+    def transpile_SayNode(self, node, body):
+        value = self.bind(body, self.expr(node.expr, body))
+        body.append(ast.Expr(value=_function("say", _method(value, "str"))))
+        return value
+
+    def transpile_AskNode(self, node, body):
+        prompt = self.expr(node.expr, body)
+        return _function("String", _function("ask", _method(prompt, "str")))
+
+    def transpile_ExitNode(self, node, body):
+        body.append(ast.Expr(value=_function("abort", _method(self.expr(node.expr, body), "str"))))
+        return ast.Constant(None)
+
+    def transpile_CallFunctionNode(self, node, body):
+        function = self.expr(node.function, body)
+        arguments = []
+        for argument in node.arguments:
+            mark = len(body)
+            value = self.expr(argument, body)
+            function = self.spill(body, mark, function)
+            arguments = [self.spill(body, mark, previous) for previous in arguments]
+            arguments.append(value)
+        return _function("_tail_call" if node.tail else "_call", function, ast.Tuple(elts=arguments, ctx=ast.Load()))
+
+    def transpile_AssignmentNode(self, node, body):
+        value = self.bind(body, self.expr(node.value, body))
+        body.append(ast.Assign(targets=[self.target(node, node.name)], value=value))
+        return value
+
+    def transpile_InPlaceAssignmentNode(self, node, body):
+        value = self.bind(body, self.expr(node.operation, body))
+        body.append(ast.Assign(targets=[self.target(node, node.name)], value=value))
+        return value
+
+    def transpile_ReferenceNode(self, node, body):
+        value = ast.IfExp(
+            test=ast.Compare(left=ast.Constant(node.name), ops=[ast.In()], comparators=[_load("env")]),
+            body=_env_item(node.name, ast.Load()),
+            orelse=_function("_undefined", ast.Constant(node.name)),
+        )
+        # Unset until assigned, so read the variable from further out meanwhile
+        for kind, index in reversed(node.places):
+            temp = self.temp()
+            value = ast.IfExp(
+                test=ast.Compare(
+                    left=ast.NamedExpr(target=_store(temp), value=_place(kind, index)),
+                    ops=[ast.IsNot()],
+                    comparators=[ast.Constant(None)],
+                ),
+                body=_load(temp),
+                orelse=value,
+            )
+        return value
+
+    def target(self, node, name):
+        """Assignment target for a global or a variable of the current call."""
+        if node.slot is None:
+            return _env_item(name, ast.Store())
+        return _place(CELL if node.cell else LOCAL, node.slot, ast.Store())
+
+
+def cache_path(script, source, options=""):
+    """Path of the cached program for `script` with the given source text and compile options."""
+    key = cache.variant_key(cache.cache_key(source, importlib.util.MAGIC_NUMBER, VERSION, TRANSPILER_VERSION), options)
+    return cache.cache_path(os.path.dirname(os.path.abspath(script)), os.path.basename(script), key, "mochapy")
+
+
+def load_cached(script, source, options=""):
+    """Return the cached PythonProgram for `script`, or None if there is none."""
+    data = cache.read(cache_path(script, source, options))
+    try:
+        return PythonProgram.loads(data) if data else None
+    except (ValueError, EOFError, TypeError, AttributeError, pickle.UnpicklingError):
+        return None
+
+
+def store_cached(script, source, program, options=""):
+    """Write `program` to the cache, replacing entries for older versions of `script`."""
+    cache.write(cache_path(script, source, options), program.dumps())
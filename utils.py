@@ -1,9 +1,14 @@
 import sys
 
+from output import OUTPUT
+
 PROMPT = "mochascript > "
+# Bump when the node classes change, so cached programs are rebuilt
+VERSION = "0.21"
 
 
 def abort(message):
     """Abort the program."""
-    print(message)
+    OUTPUT.say(message)
+    OUTPUT.flush(wait=True)
     sys.exit()
@@ -0,0 +1,152 @@
+from compiler import *
+
+
+class CompiledFunction(Function):
+    """Function whose body has been compiled to bytecode."""
+
+    __slots__ = ()
+
+    def __init__(self, code, closure=None):
+        super().__init__(code, code.parameters, closure, code.name)
+        self.scope = code.scope
+
+    def run(self, arguments):
+        """Run the function from tree-walking code."""
+        FRAMES.append(Frame(self.scope, self.closure, [arguments.get(name) for name in self.parameters]))
+        try:
+            return VM().run(self.body)
+        finally:
+            FRAMES.pop()
+
+
+class VM:
+    """Stack-based virtual machine that runs compiled MochaScript."""
+
+    def run(self, code):
+        """Run a CodeObject in the current environment and return its result."""
+        frames = []
+        stack = []
+        instructions, consts, names = code.instructions, code.consts, code.names
+        env = ENV[-1]
+        frame = FRAMES[-1]
+        pc = 0
+
+        while True:
+            op = instructions[pc]
+            arg = instructions[pc + 1]
+            pc += 2
+
+            if op == LOAD_NAME:
+                value = env.get(names[arg])
+                if value is None:
+                    abort(f"Undefined variable '{names[arg]}'")
+                stack.append(value)
+            elif op == LOAD_FAST:
+                value = frame.slots[arg]
+                stack.append(load_global(frame.scope.names[arg]) if value is None else value)
+            elif op == LOAD_CONST:
+                stack.append(consts[arg])
+            elif op == BINARY_OP:
+                right = stack.pop()
+                left = stack[-1]
+                if type(left) is Number and type(right) is Number and NUMBER_OPERATIONS[arg]:
+                    operate, result_type = NUMBER_OPERATIONS[arg]
+                    stack[-1] = result_type(operate(left.value, right.value))
+                else:
+                    stack[-1] = getattr(left, BINARY_METHODS[arg])(right)
+            elif op == STORE_FAST:
+                frame.slots[arg] = stack[-1]
+            elif op == LOAD_CELL:
+                value = frame.slots[arg].value
+                stack.append(load_global(frame.scope.names[arg]) if value is None else value)
+            elif op == LOAD_FREE:
+                value = frame.closure[arg].value
+                stack.append(load_global(frame.scope.free[arg][1]) if value is None else value)
+            elif op == STORE_CELL:
+                frame.slots[arg].value = stack[-1]
+            elif op == STORE_NAME:
+                env[names[arg]] = stack[-1]
+            elif op == POP_TOP:
+                stack.pop()
+            elif op == POP_JUMP_IF_FALSE:
+                if not stack.pop().value:
+                    pc = arg
+            elif op == JUMP:
+                pc = arg
+            elif op == FOR_ITER:
+                item = next(stack[-1], None)
+                if item is None:
+                    stack.pop()
+                    pc = arg
+                else:
+                    stack.append(item)
+            elif op == UPDATE_LOOP_RESULT:
+                stack[-2] = stack.pop()
+            elif op == CALL_FUNCTION or op == TAIL_CALL:
+                arguments = stack[len(stack) - arg :]
+                del stack[len(stack) - arg :]
+                function = stack.pop()
+                if isinstance(function, CompiledFunction):
+                    # Run the callee in this loop instead of recursing in Python
+                    frame = Frame(function.scope, function.closure, arguments[: len(function.parameters)])
+                    if op == CALL_FUNCTION:
+                        frames.append((code, pc, stack))
+                        FRAMES.append(frame)
+                    else:
+                        # Nothing is left to do in the current call, so the callee takes its place
+                        FRAMES[-1] = frame
+                    code = function.body
+                    instructions, consts, names = code.instructions, code.consts, code.names
+                    stack = []
+                    pc = 0
+                elif hasattr(function, "call"):
+                    stack.append(function.call(dict(zip(function.parameters, arguments))))
+                else:
+                    abort(f"{function.repr()} is not a callable object!")
+            elif op == RETURN_VALUE:
+                result = stack.pop()
+                if not frames:
+                    return result
+                FRAMES.pop()
+                frame = FRAMES[-1]
+                code, pc, stack = frames.pop()
+                instructions, consts, names = code.instructions, code.consts, code.names
+                stack.append(result)
+            elif op == TO_BOOL:
+                stack[-1] = Boolean(stack[-1].value)
+            elif op == JUMP_IF_FALSE_OR_POP:
+                if stack[-1].value:
+                    stack.pop()
+                else:
+                    pc = arg
+            elif op == JUMP_IF_TRUE_OR_POP:
+                if stack[-1].value:
+                    pc = arg
+                else:
+                    stack.pop()
+            elif op == UNARY_OP:
+                stack[-1] = getattr(stack[-1], UNARY_METHODS[arg])()
+            elif op == LOAD_ATTR:
+                stack[-1] = consts[arg].load(stack[-1])
+            elif op == GET_ITER:
+                iterable = stack[-1]
+                if not isinstance(iterable, ITERABLES):
+                    abort("For-loop can only accept an iterator")
+                stack[-1] = iter(iterable)
+            elif op == BUILD_RANGE:
+                end = stack.pop()
+                stack[-1] = Range(int(stack[-1].value), int(end.value))
+            elif op == MAKE_FUNCTION:
+                scope = consts[arg].scope
+                # Functions nested in another function close over the cells of this call
+                stack.append(CompiledFunction(consts[arg], capture(frame, scope) if scope.enclosing else None))
+            elif op == SAY:
+                say(stack[-1].str())
+            elif op == ASK:
+                stack[-1] = String(ask(stack[-1].str()))
+            elif op == EXIT:
+                abort(stack.pop().str())
+            elif op == EVAL_NODE:
+                stack.append(consts[arg].visit())
+            else:
+                raise RuntimeError(f"Unknown opcode {op}")